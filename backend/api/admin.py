@@ -42,7 +42,7 @@ class TicketAttachmentInline(admin.TabularInline):
 class TicketHistoryInline(admin.TabularInline):
     model = TicketHistory
     extra = 0
-    readonly_fields = ('user', 'action', 'created_at')
+    readonly_fields = ('user', 'action', 'field', 'old_value', 'new_value', 'created_at')
     can_delete = False
     classes = ['collapse']
 
@@ -1,4 +1,3 @@
-
 from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
@@ -6,13 +5,6 @@ class ApiConfig(AppConfig):
     name = 'api'
 
     def ready(self):
-        try:
-            from django.contrib.auth import get_user_model
-            User = get_user_model()
-            if not User.objects.filter(username='admin').exists():
-                print("Auto-creating superuser 'admin'...")
-                User.objects.create_superuser('admin', 'admin@example.com', 'admin12345')
-                print("Superuser 'admin' created successfully.")
-        except Exception as e:
-            # Prevents issues during initial migrations where tables might not exist yet
-            pass
+        # Только регистрация сигналов - без запросов к БД: ready() выполняется при каждом старте процесса.
+        # Администратор создается явно: python manage.py bootstrap_admin
+        from . import attachments, dashboard, search  # noqa: F401 - регистрируют сигналы вложений, кеша дашборда и поискового индекса
@@ -0,0 +1,263 @@
+import hashlib
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.move import file_move_safe
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.http import content_disposition_header
+
+from .models import AttachmentUpload, TicketAttachment
+
+# Хранение вложений. Файл кладется по хешу содержимого (attachments/sha256/ab/<hash>), поэтому один и тот же файл,
+# прикрепленный к разным задачам, лежит на диске один раз. Большие файлы грузятся по частям (AttachmentUpload):
+# каждая часть - короткий запрос, который сразу дописывается на диск, воркер не держит файл в памяти.
+# Скачивание - по подписанной ссылке, с ETag и Range; при ATTACHMENT_SENDFILE_HEADER файл отдает веб-сервер.
+
+BUFFER_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def blob_name(digest):
+    return f'attachments/sha256/{digest[:2]}/{digest}'
+
+
+def thumbnail_name(key):
+    return f'attachments/thumbnails/{key[:2]}/{key}-{settings.ATTACHMENT_THUMBNAIL_SIZE}.jpg'
+
+
+def is_image(filename):
+    return (mimetypes.guess_type(filename or '')[0] or '').startswith('image/')
+
+
+def store_uploaded_file(uploaded):
+    # Обычная multipart-загрузка: Django уже положил файл в память/временный файл - считаем хеш и сохраняем, если его еще нет
+    digest = hashlib.sha256()
+    for chunk in uploaded.chunks(BUFFER_SIZE):
+        digest.update(chunk)
+    name = blob_name(digest.hexdigest())
+    if not default_storage.exists(name):
+        uploaded.seek(0)
+        name = default_storage.save(name, uploaded)
+    return name, digest.hexdigest(), uploaded.size
+
+
+def store_temp_file(path):
+    # Собранный по частям файл переносится в хранилище без копирования (та же ФС); дубликат просто удаляется
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(BUFFER_SIZE), b''):
+            digest.update(chunk)
+    name = blob_name(digest.hexdigest())
+    target = default_storage.path(name)
+    size = os.path.getsize(path)
+    if os.path.exists(target):
+        os.remove(path)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        file_move_safe(path, target, allow_overwrite=True)
+    return name, digest.hexdigest(), size
+
+
+def upload_temp_path(upload):
+    return os.path.join(settings.ATTACHMENT_UPLOAD_TEMP_DIR, f'{upload.id}.part')
+
+
+def start_upload(user, ticket, filename, size):
+    if size <= 0: raise UploadError('size must be positive.')
+    if size > settings.ATTACHMENT_MAX_SIZE: raise UploadError(f'File is larger than {settings.ATTACHMENT_MAX_SIZE} bytes.', 413)
+    upload = AttachmentUpload.objects.create(ticket=ticket, user=user, filename=os.path.basename(filename)[:255], size=size)
+    os.makedirs(settings.ATTACHMENT_UPLOAD_TEMP_DIR, exist_ok=True)
+    open(upload_temp_path(upload), 'wb').close()
+    return upload
+
+
+def append_chunk(upload_id, user, stream, content_range):
+    """Дописывает часть `Content-Range: bytes start-end/total`; возвращает (upload, attachment или None)."""
+    match = CONTENT_RANGE_RE.match(content_range or '')
+    if not match: raise UploadError('Content-Range header "bytes start-end/total" is required.')
+    start, end, total = map(int, match.groups())
+    length = end - start + 1
+    if length <= 0: raise UploadError('Empty chunk.')
+    if length > settings.ATTACHMENT_CHUNK_SIZE: raise UploadError(f'Chunk is larger than {settings.ATTACHMENT_CHUNK_SIZE} bytes.', 413)
+
+    with transaction.atomic():
+        # Блокировка строки сериализует параллельные части одной загрузки
+        upload = AttachmentUpload.objects.select_for_update().filter(id=upload_id, user=user).first()
+        if upload is None: raise UploadError('Upload not found.', 404)
+        if total != upload.size or end >= upload.size: raise UploadError('Content-Range does not match the upload size.')
+        # Клиент продолжает не с того места - отвечаем текущим offset, он досылает с него
+        if start != upload.offset: raise UploadError(f'Expected offset {upload.offset}.', 409)
+        path = upload_temp_path(upload)
+        if not os.path.exists(path): raise UploadError('Upload has expired.', 410)
+
+        received = 0
+        with open(path, 'r+b') as f:
+            f.seek(start)
+            f.truncate()
+            while received < length:
+                data = stream.read(min(BUFFER_SIZE, length - received))
+                if not data: break
+                f.write(data)
+                received += len(data)
+            if received != length:
+                f.truncate(start)
+                raise UploadError('Chunk is shorter than its Content-Range.')
+        upload.offset = end + 1
+        if upload.offset < upload.size:
+            upload.save(update_fields=['offset', 'updated_at'])
+            return upload, None
+
+        name, digest, size = store_temp_file(path)
+        attachment = TicketAttachment.objects.create(ticket_id=upload.ticket_id, user=user, file=name,
+                                                     filename=upload.filename, sha256=digest, size=size)
+        upload.delete()
+        return upload, attachment
+
+
+def abort_upload(upload):
+    path = upload_temp_path(upload)
+    upload.delete()
+    if os.path.exists(path): os.remove(path)
+
+
+def signed_url(request, attachment, kind):
+    token = signing.dumps(attachment.id, salt=f'attachments.{kind}')
+    url = f"{reverse(f'ticketattachment-{kind}', args=[attachment.id])}?sig={token}"
+    return request.build_absolute_uri(url) if request else url
+
+
+def check_signature(request, attachment, kind):
+    try:
+        return signing.loads(request.query_params.get('sig', ''), salt=f'attachments.{kind}', max_age=settings.ATTACHMENT_URL_MAX_AGE) == attachment.id
+    except signing.BadSignature:
+        return False
+
+
+def etag(attachment):
+    if attachment.sha256: return f'"{attachment.sha256}"'
+    # Старые вложения без хеша - по имени, размеру и времени изменения
+    try:
+        stat = os.stat(default_storage.path(attachment.file.name))
+    except OSError:
+        raise Http404('File is missing.')
+    return f'W/"{attachment.id}-{stat.st_size}-{int(stat.st_mtime)}"'
+
+
+def file_response(request, name, filename, tag, as_attachment=True, cache_control=None):
+    cache_control = cache_control or f'private, max-age={settings.ATTACHMENT_CACHE_MAX_AGE}'
+    if tag in [value.strip() for value in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponseNotModified()
+        response['ETag'] = tag
+        response['Cache-Control'] = cache_control
+        return response
+    path = default_storage.path(name)
+    if not os.path.exists(path): raise Http404('File is missing.')
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    size = os.path.getsize(path)
+
+    header = settings.ATTACHMENT_SENDFILE_HEADER
+    if header:
+        # Range, sendfile и докачку делает веб-сервер; Python-процесс освобождается сразу
+        response = HttpResponse(content_type=content_type)
+        response[header] = settings.ATTACHMENT_SENDFILE_PREFIX + name if header == 'X-Accel-Redirect' else path
+    else:
+        byte_range = None
+        if request.headers.get('Range') and request.headers.get('If-Range', tag) == tag:
+            byte_range = _parse_range(request.headers['Range'], size)
+            if byte_range is False:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(_read_range(path, start, end), status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = tag
+    response['Cache-Control'] = cache_control
+    response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    return response
+
+
+def _parse_range(header, size):
+    # Один диапазон bytes=a-b / a- / -n; несколько диапазонов отдаются целым файлом. False - диапазон вне файла
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''): return None
+    first, last = match.groups()
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start: return None
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size or size == 0: return False
+    return start, end
+
+
+def _read_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            data = f.read(min(BUFFER_SIZE, remaining))
+            if not data: break
+            remaining -= len(data)
+            yield data
+
+
+def thumbnail(attachment):
+    """Имя превью (JPEG) для изображения - создается при первом запросе; None, если файл не картинка."""
+    if not is_image(attachment.filename): return None
+    name = thumbnail_name(attachment.sha256 or f'id{attachment.id}')
+    target = default_storage.path(name)
+    if os.path.exists(target): return name
+    # Pillow уже нужен для ImageField аватаров; импортируется только при первом построении превью
+    from PIL import Image, ImageOps
+    size = settings.ATTACHMENT_THUMBNAIL_SIZE
+    try:
+        with Image.open(default_storage.path(attachment.file.name)) as image:
+            image.draft('RGB', (size, size))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((size, size))
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            partial = f'{target}.{os.getpid()}.tmp'
+            image.convert('RGB').save(partial, 'JPEG', quality=80, optimize=True)
+            os.replace(partial, target)
+    except (OSError, Image.DecompressionBombError):
+        return None
+    return name
+
+
+@receiver(post_delete, sender=TicketAttachment)
+def delete_unreferenced_file(sender, instance, **kwargs):
+    # Файл по хешу удаляется вместе с последним вложением, которое на него ссылается
+    if not instance.sha256: return
+    name = instance.file.name
+
+    def cleanup():
+        if TicketAttachment.objects.filter(file=name).exists(): return
+        default_storage.delete(name)
+        default_storage.delete(thumbnail_name(instance.sha256))
+    transaction.on_commit(cleanup)
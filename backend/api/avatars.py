@@ -0,0 +1,65 @@
+import os
+import re
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+# Уменьшенные копии аватаров: квадрат каждого размера из AVATAR_VARIANT_SIZES в WebP и JPEG.
+# Имя файла содержит хеш исходника, поэтому ссылка меняется вместе с аватаром и копии можно кешировать навсегда.
+# Строятся сразу при загрузке через /api/users/me/ или лениво при первом запросе /api/avatars/<hash>-<px>.<ext>.
+
+FORMATS = {'webp': ('WEBP', {'quality': 80, 'method': 4}), 'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True})}
+NAME_RE = re.compile(r'^([0-9a-f]{64})-(\d+)\.(webp|jpg)$')
+
+
+def variant_name(digest, size, ext):
+    return f'avatars/variants/{digest[:2]}/{digest}-{size}.{ext}'
+
+
+def variant_urls(request, profile):
+    if not profile.avatar_hash: return None
+    urls = {}
+    for label, size in settings.AVATAR_VARIANT_SIZES.items():
+        urls[label] = {}
+        for ext in FORMATS:
+            url = reverse('avatar-variant', args=[f'{profile.avatar_hash}-{size}.{ext}'])
+            urls[label]['jpeg' if ext == 'jpg' else ext] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
+def build_variants(profile):
+    """Строит все недостающие копии аватара; False, если исходник не читается как изображение."""
+    digest = profile.avatar_hash
+    missing = [(size, ext) for size in settings.AVATAR_VARIANT_SIZES.values() for ext in FORMATS
+               if not default_storage.exists(variant_name(digest, size, ext))]
+    if not missing: return True
+    # Pillow уже нужен для ImageField; импортируется только когда действительно надо что-то строить
+    from PIL import Image, ImageOps
+    try:
+        with profile.avatar.open('rb') as source, Image.open(source) as image:
+            image.draft('RGB', (max(size for size, _ in missing),) * 2)
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            for size, ext in missing:
+                target = default_storage.path(variant_name(digest, size, ext))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                partial = f'{target}.{os.getpid()}.tmp'
+                image_format, options = FORMATS[ext]
+                ImageOps.fit(image, (size, size), Image.LANCZOS).save(partial, image_format, **options)
+                os.replace(partial, target)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return False
+    return True
+
+
+def resolve(filename):
+    """Имя файла копии по имени из URL; недостающая копия строится из исходника. None - такой копии нет."""
+    match = NAME_RE.match(filename or '')
+    if not match or int(match.group(2)) not in settings.AVATAR_VARIANT_SIZES.values(): return None
+    digest, size, ext = match.groups()
+    name = variant_name(digest, size, ext)
+    if default_storage.exists(name): return name
+    from .models import Profile
+    profile = Profile.objects.filter(avatar_hash=digest).exclude(avatar='').first()
+    if profile is None or not build_variants(profile): return None
+    return name
@@ -0,0 +1,193 @@
+import io
+import math
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import (
+    Department, Notification, Profile, ProfileDepartment, ProfileSkill, Project, ProjectStage, Skill, Tag, Ticket,
+    WorkLog, WorkType,
+)
+
+# Нагрузочный прогон API (команда benchmark_api): синтетические данные заданного объема в пустой тестовой базе,
+# затем основные списки через тестовый клиент DRF. Число SQL-запросов на ответ не должно зависеть от объема данных -
+# его рост и есть N+1; время ответа сравнивается по перцентилям.
+
+ENDPOINTS = {
+    'projects': '/api/projects/',
+    'tickets': '/api/tickets/',
+    'tickets_page': '/api/tickets/?page_size=50',
+    'tickets_changes': '/api/tickets/changes/',
+    'dashboard': '/api/dashboard/',
+    'users': '/api/users/',
+    'stages': '/api/stages/',
+}
+
+DEFAULT_SCALE = {
+    'users': 50,
+    'projects': 20,
+    'stages': 5,
+    'tickets': 2000,
+    'worklogs': 20000,
+    'notifications': 5000,
+}
+
+BATCH_SIZE = 1000
+WORKLOG_DAYS = 60
+
+
+def _create(model, objects):
+    # bulk_create не везде возвращает id (MySQL), а база пустая - поэтому id просто перечитываются по порядку
+    model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+    return list(model.objects.order_by('id').values_list('id', flat=True))
+
+
+def seed(scale, rng_seed=0):
+    """Заполняет пустую базу; возвращает пользователя-сотрудника, от имени которого идут запросы."""
+    rng = random.Random(rng_seed)
+    now = timezone.now()
+
+    department_ids = _create(Department, [Department(name=f'Отдел {i}') for i in range(5)])
+    skill_ids = _create(Skill, [Skill(name=f'Навык {i}') for i in range(10)])
+    tag_ids = _create(Tag, [Tag(name=f'tag-{i}') for i in range(10)])
+    root_types = _create(WorkType, [WorkType(name=name) for name in ('Разработка', 'Тестирование', 'Аналитика')])
+    work_type_ids = _create(WorkType, [WorkType(name='Код-ревью', parent_id=root_types[0])])
+
+    user_ids = _create(User, [
+        User(username=f'bench{i}', first_name=f'Имя{i}', last_name=f'Фамилия{i}', email=f'bench{i}@example.com',
+             password='!', is_staff=i == 0)
+        for i in range(max(scale['users'], 1))
+    ])
+    roles = [value for value, _ in Profile.ROLE_CHOICES]
+    profile_ids = _create(Profile, [Profile(user_id=user_id, role=rng.choice(roles)) for user_id in user_ids])
+    ProfileDepartment.objects.bulk_create([
+        ProfileDepartment(profile_id=profile_id, department_id=department_id)
+        for profile_id in profile_ids for department_id in rng.sample(department_ids, 2)
+    ], batch_size=BATCH_SIZE)
+    ProfileSkill.objects.bulk_create([
+        ProfileSkill(profile_id=profile_id, skill_id=skill_id)
+        for profile_id in profile_ids for skill_id in rng.sample(skill_ids, 3)
+    ], batch_size=BATCH_SIZE)
+
+    project_ids = _create(Project, [Project(name=f'Проект {i}') for i in range(scale['projects'])])
+    Project.leads.through.objects.bulk_create([
+        Project.leads.through(project_id=project_id, user_id=user_id)
+        for project_id in project_ids for user_id in rng.sample(user_ids, min(2, len(user_ids)))
+    ], batch_size=BATCH_SIZE)
+    Project.participants.through.objects.bulk_create([
+        Project.participants.through(project_id=project_id, profile_id=profile_id)
+        for project_id in project_ids for profile_id in rng.sample(profile_ids, min(5, len(profile_ids)))
+    ], batch_size=BATCH_SIZE)
+
+    stage_projects = [project_id for project_id in project_ids for _ in range(scale['stages'])]
+    stage_ids = _create(ProjectStage, [
+        ProjectStage(project_id=project_id, name=f'Этап {i}', status=rng.choice(['ACTIVE', 'ACTIVE', 'CLOSED']))
+        for i, project_id in enumerate(stage_projects)
+    ])
+    stages_by_project = {}
+    for stage_id, project_id in zip(stage_ids, stage_projects):
+        stages_by_project.setdefault(project_id, []).append(stage_id)
+
+    tickets = []
+    for i in range(scale['tickets'] if project_ids else 0):
+        project_id = rng.choice(project_ids)
+        stages = stages_by_project.get(project_id)
+        tickets.append(Ticket(
+            project_id=project_id, stage_id=rng.choice(stages) if stages and rng.random() < 0.9 else None,
+            title=f'Задача {i}', creator_id=rng.choice(user_ids),
+            assignee_id=rng.choice(user_ids) if rng.random() < 0.8 else None,
+            status=rng.choice(['OPEN', 'IN_PROGRESS', 'REVIEW', 'DONE', 'DONE']),
+            priority=rng.choice(['LOW', 'MEDIUM', 'HIGH', 'CRITICAL']),
+        ))
+    ticket_ids = _create(Ticket, tickets)
+    # Сдвиг в прошлое: иначе /tickets/changes/ отсекает только что созданные задачи по TICKET_SYNC_LAG и меряет пустой ответ
+    Ticket.objects.update(created_at=F('created_at') - timedelta(hours=1), updated_at=F('updated_at') - timedelta(hours=1))
+    Ticket.tags.through.objects.bulk_create([
+        Ticket.tags.through(ticket_id=ticket_id, tag_id=tag_id)
+        for ticket_id in ticket_ids for tag_id in rng.sample(tag_ids, rng.randint(0, 2))
+    ], batch_size=BATCH_SIZE)
+    Ticket.watchers.through.objects.bulk_create([
+        Ticket.watchers.through(ticket_id=ticket_id, user_id=user_id)
+        for ticket_id in ticket_ids for user_id in rng.sample(user_ids, min(rng.randint(0, 2), len(user_ids)))
+    ], batch_size=BATCH_SIZE)
+
+    days = [rng.randrange(WORKLOG_DAYS) for _ in range(scale['worklogs'] if ticket_ids else 0)]
+    WorkLog.objects.bulk_create([
+        WorkLog(ticket_id=rng.choice(ticket_ids), user_id=rng.choice(user_ids), work_type_id=rng.choice(work_type_ids),
+                time_spent_minutes=rng.randint(15, 240), created_at=now - timedelta(days=day))
+        for day in days
+    ], batch_size=BATCH_SIZE)
+    call_command('rebuild_time_rollup', stdout=io.StringIO())
+
+    Notification.objects.bulk_create([
+        Notification(user_id=rng.choice(user_ids), message=f'Уведомление {i}', link=f'/tickets/{rng.choice(ticket_ids)}' if ticket_ids else None,
+                     is_read=rng.random() < 0.7)
+        for i in range(scale['notifications'])
+    ], batch_size=BATCH_SIZE)
+    return User.objects.get(id=user_ids[0])
+
+
+def percentile(values, p):
+    # Ближайший ранг: p95 из 20 замеров - 19-й по возрастанию
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+class QueryCounter:
+    # execute_wrapper видит каждый запрос, в отличие от connection.queries не зависит от DEBUG и лимита журнала
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def run(user, endpoints, iterations, warmup=1):
+    """Прогоняет каждый адрес warmup + iterations раз; возвращает {имя: {url, status, queries, p50_ms, ...}}."""
+    client = APIClient()
+    client.force_authenticate(user)
+    results = {}
+    for name, url in endpoints.items():
+        # Кеш сбрасывается перед каждым запросом: меряется худший случай (например, сборка дашборда с нуля)
+        for _ in range(warmup):
+            cache.clear()
+            client.get(url)
+        cache.clear()
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            response = client.get(url)
+        timings = []
+        for _ in range(iterations):
+            cache.clear()
+            started = time.perf_counter()
+            client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+        results[name] = {
+            'url': url, 'status': response.status_code, 'queries': queries.count, 'bytes': len(response.content),
+            'p50_ms': round(percentile(timings, 50), 1), 'p95_ms': round(percentile(timings, 95), 1),
+            'p99_ms': round(percentile(timings, 99), 1), 'max_ms': round(max(timings), 1),
+        }
+    return results
+
+
+def check_budgets(results, budgets, latency=True):
+    """Список нарушений: неуспешный ответ, превышение числа запросов или p95."""
+    violations = []
+    for name, result in results.items():
+        if result['status'] != 200:
+            violations.append(f"{name}: HTTP {result['status']}")
+        budget = budgets.get(name, {})
+        if budget.get('queries') is not None and result['queries'] > budget['queries']:
+            violations.append(f"{name}: {result['queries']} SQL queries, budget {budget['queries']}")
+        if latency and budget.get('p95_ms') is not None and result['p95_ms'] > budget['p95_ms']:
+            violations.append(f"{name}: p95 {result['p95_ms']} ms, budget {budget['p95_ms']} ms")
+    return violations
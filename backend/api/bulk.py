@@ -0,0 +1,136 @@
+import operator
+from functools import reduce
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import dashboard
+from .history import build_history_rows
+from .models import ProjectStage, Tag, Ticket, TicketHistory, TimeRollup
+from .notifications import NotificationDispatcher
+from .serializers import TicketBulkOperationSerializer
+
+# Массовые операции над задачами (POST /api/tickets/bulk/): все операции применяются в памяти,
+# затем пишутся фиксированным числом запросов - bulk_update полей, пачка изменений тегов,
+# bulk_create истории и одна отправка уведомлений. Ошибочные операции пропускаются и попадают в результат.
+
+SCALAR_FIELDS = ['status', 'priority', 'assignee', 'stage', 'due_date']
+NOTIFY_FIELDS = ('status', 'priority', 'stage', 'due_date')
+
+
+class BulkError(Exception):
+    pass
+
+
+def apply_ticket_operations(user, queryset, operations):
+    if not isinstance(operations, list) or not operations:
+        raise BulkError('Expected a non-empty list of operations.')
+    limit = getattr(settings, 'TICKET_BULK_MAX_OPERATIONS', 1000)
+    if len(operations) > limit:
+        raise BulkError(f'At most {limit} operations per request.')
+
+    results = [None] * len(operations)
+    parsed = []
+    for index, data in enumerate(operations):
+        serializer = TicketBulkOperationSerializer(data=data)
+        if serializer.is_valid(): parsed.append((index, serializer.validated_data))
+        else: results[index] = {'id': data.get('id') if isinstance(data, dict) else None, 'ok': False, 'errors': serializer.errors}
+
+    with transaction.atomic():
+        tickets = {ticket.id: ticket for ticket in queryset.select_for_update().filter(id__in={op['id'] for _, op in parsed}).prefetch_related('tags')}
+        user_ids = set(User.objects.filter(id__in={op['assignee'] for _, op in parsed if op.get('assignee')}).values_list('id', flat=True))
+        stages = dict(ProjectStage.objects.filter(id__in={op['stage'] for _, op in parsed if op.get('stage')}).values_list('id', 'project_id'))
+        tag_ids = set(Tag.objects.filter(id__in={i for _, op in parsed for key in ('tags', 'add_tags', 'remove_tags') for i in op.get(key, ())}).values_list('id', flat=True))
+
+        before, tags = {}, {}
+        for index, op in parsed:
+            ticket = tickets.get(op['id'])
+            errors = _check_references(op, ticket, user_ids, stages, tag_ids)
+            if errors:
+                results[index] = {'id': op['id'], 'ok': False, 'errors': errors}
+                continue
+            if ticket.id not in before:
+                tags[ticket.id] = {tag.id for tag in ticket.tags.all()}
+                before[ticket.id] = _snapshot(ticket, tags[ticket.id])
+            for field in SCALAR_FIELDS:
+                if field in op: setattr(ticket, Ticket._meta.get_field(field).attname, op[field])
+            if 'tags' in op: tags[ticket.id] = set(op['tags'])
+            tags[ticket.id] |= set(op.get('add_tags', ()))
+            tags[ticket.id] -= set(op.get('remove_tags', ()))
+            results[index] = {'id': ticket.id, 'ok': True}
+
+        changed = {}
+        for ticket_id, old in before.items():
+            new = _snapshot(tickets[ticket_id], tags[ticket_id])
+            changes = [(field, old[field], new[field]) for field in old if old[field] != new[field]]
+            if changes: changed[ticket_id] = changes
+        if changed: _save(user, tickets, changed)
+
+    return {'updated': len(changed), 'results': results}
+
+
+def _check_references(op, ticket, user_ids, stages, tag_ids):
+    if ticket is None: return {'id': ['Ticket not found.']}
+    errors = {}
+    if op.get('assignee') and op['assignee'] not in user_ids:
+        errors['assignee'] = ['Unknown user.']
+    if op.get('stage'):
+        if op['stage'] not in stages: errors['stage'] = ['Unknown stage.']
+        elif stages[op['stage']] != ticket.project_id: errors['stage'] = ['Stage belongs to another project.']
+    for key in ('tags', 'add_tags', 'remove_tags'):
+        unknown = [i for i in op.get(key, ()) if i not in tag_ids]
+        if unknown: errors[key] = [f"Unknown tags: {', '.join(map(str, unknown))}."]
+    return errors
+
+
+def _snapshot(ticket, tag_ids):
+    values = {field: getattr(ticket, Ticket._meta.get_field(field).attname) for field in SCALAR_FIELDS}
+    values['tags'] = tuple(sorted(tag_ids))
+    return values
+
+
+def _save(user, tickets, changed):
+    now = timezone.now()
+    rows = [tickets[ticket_id] for ticket_id in changed]
+    for ticket in rows: ticket.updated_at = now
+    fields = {field for changes in changed.values() for field, _, _ in changes if field != 'tags'}
+    Ticket.objects.bulk_update(rows, [*sorted(fields), 'updated_at'], batch_size=500)
+
+    # Теги - один INSERT и один DELETE на всю пачку, минуя m2m_changed
+    through = Ticket.tags.through
+    added, removed = [], []
+    for ticket_id, changes in changed.items():
+        for field, old, new in changes:
+            if field != 'tags': continue
+            added += [through(ticket_id=ticket_id, tag_id=tag_id) for tag_id in set(new) - set(old)]
+            if set(old) - set(new): removed.append(Q(ticket_id=ticket_id, tag_id__in=set(old) - set(new)))
+    if added: through.objects.bulk_create(added, ignore_conflicts=True)
+    if removed: through.objects.filter(reduce(operator.or_, removed)).delete()
+
+    # bulk_update не шлет post_save: накопленное время переносим за этапом сами - один UPDATE на этап
+    moved = {}
+    for ticket_id, changes in changed.items():
+        if any(field == 'stage' for field, _, _ in changes):
+            moved.setdefault(tickets[ticket_id].stage_id, []).append(ticket_id)
+    for stage_id, ticket_ids in moved.items():
+        TimeRollup.objects.filter(ticket_id__in=ticket_ids).update(stage_id=stage_id, stage_key=stage_id or 0)
+
+    history = TicketHistory.objects.bulk_create(build_history_rows(user, [(tickets[ticket_id], changes) for ticket_id, changes in changed.items()]))
+
+    notifications = NotificationDispatcher(actor=user)
+    summaries = {}
+    for row in history:
+        if row.field in NOTIFY_FIELDS: summaries.setdefault(row.ticket_id, []).append(row.action)
+    for ticket_id, changes in changed.items():
+        ticket = tickets[ticket_id]
+        if any(field == 'assignee' for field, _, _ in changes):
+            notifications.add([ticket.assignee_id], f"На вас переназначена задача #{ticket.id}: {ticket.title}", f"/tickets/{ticket.id}")
+    notifications.add_tickets_audience([(tickets[ticket_id], f"Задача #{ticket_id}: {user.username}: {'; '.join(actions)}")
+                                        for ticket_id, actions in summaries.items()])
+    notifications.dispatch()
+
+    owners = {ticket.assignee_id for ticket in rows} | {ticket._dashboard_owner_id for ticket in rows}
+    dashboard.invalidate(global_stats=True, user_ids=owners)
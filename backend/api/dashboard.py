@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Ticket, WorkLog
+
+# Дашборд кешируется двумя частями: общая статистика (одна на всех) и персональная часть каждого пользователя.
+# Дата в ключе сама сбрасывает кеш в полночь; записи Ticket/WorkLog сбрасывают только затронутые ключи.
+
+
+def global_key():
+    return f'dashboard:global:{timezone.localdate()}'
+
+
+def user_key(user_id):
+    return f'dashboard:user:{user_id}:{timezone.localdate()}'
+
+
+def get_cached(key, build):
+    return cache.get_or_set(key, build, getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300))
+
+
+def invalidate(global_stats=False, user_ids=()):
+    keys = [user_key(user_id) for user_id in set(user_ids) if user_id]
+    if global_stats: keys.append(global_key())
+    # После коммита: иначе параллельный запрос успеет закешировать еще не закоммиченное состояние
+    if keys: transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+@receiver(post_init, sender=Ticket)
+@receiver(post_init, sender=WorkLog)
+def remember_dashboard_owner(sender, instance, **kwargs):
+    instance._dashboard_owner_id = instance.assignee_id if sender is Ticket else instance.user_id
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Ticket)
+def invalidate_on_ticket_change(sender, instance, **kwargs):
+    invalidate(global_stats=True, user_ids=[instance.assignee_id, instance._dashboard_owner_id])
+    instance._dashboard_owner_id = instance.assignee_id
+
+
+@receiver(m2m_changed, sender=Ticket.tags.through)
+def invalidate_on_ticket_tags_change(sender, instance, action, **kwargs):
+    if action.startswith('post_') and isinstance(instance, Ticket):
+        invalidate(user_ids=[instance.assignee_id])
+
+
+@receiver(post_save, sender=WorkLog)
+@receiver(post_delete, sender=WorkLog)
+def invalidate_on_worklog_change(sender, instance, **kwargs):
+    invalidate(global_stats=True, user_ids=[instance.user_id, instance._dashboard_owner_id])
+    instance._dashboard_owner_id = instance.user_id
@@ -0,0 +1,9 @@
+from django.db.backends.mysql import base
+
+from api.db.pooling import PooledConnectionMixin
+
+
+class DatabaseWrapper(PooledConnectionMixin, base.DatabaseWrapper):
+    # ENGINE = 'api.db.mysql': стандартный бэкенд MySQL/MariaDB (mysqlclient) с пулом соединений процесса
+    def ping_connection(self, connection):
+        connection.ping()
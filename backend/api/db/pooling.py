@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import Counter, deque
+
+# Пул соединений процесса для многопоточных воркеров. Django держит соединение на поток (CONN_MAX_AGE), и каждый новый
+# поток Passenger/runserver заново проходит TCP и авторизацию MySQL. С POOL_SIZE > 0 соединение, которое Django закрывает
+# в конце запроса, возвращается в пул, и следующий запрос любого потока берет его оттуда после проверки (ping).
+# Бэкенды api.db.mysql / api.db.sqlite3 подмешивают PooledConnectionMixin; без POOL_SIZE ведут себя как стандартные.
+# Модели здесь не импортируются - модуль нужен до загрузки приложений.
+
+_pools = {}
+_pools_lock = threading.Lock()
+_stats = {}
+
+
+class ConnectionPool:
+    def __init__(self, size, max_lifetime):
+        self.size = size
+        self.max_lifetime = max_lifetime
+        self._idle = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self, ping, stats):
+        # Берем самое свежее соединение (LIFO): у него меньше шансов упереться в wait_timeout сервера
+        while True:
+            with self._lock:
+                if not self._idle: return None
+                connection, created = self._idle.pop()
+            if time.monotonic() - created > self.max_lifetime:
+                stats['expired'] += 1
+                _close_quietly(connection, stats)
+                continue
+            try:
+                ping(connection)
+            except Exception:
+                stats['health_check_failures'] += 1
+                _close_quietly(connection, stats)
+                continue
+            stats['reused'] += 1
+            return connection, created
+
+    def release(self, connection, created):
+        if time.monotonic() - created > self.max_lifetime: return False
+        with self._lock:
+            if len(self._idle) >= self.size: return False
+            self._idle.append((connection, created))
+        return True
+
+    def idle(self):
+        return len(self._idle)
+
+
+def _close_quietly(connection, stats):
+    stats['closed'] += 1
+    try: connection.close()
+    except Exception: pass
+
+
+def get_pool(alias, settings_dict):
+    size = settings_dict.get('POOL_SIZE') or 0
+    if size <= 0: return None
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None:
+            pool = _pools[alias] = ConnectionPool(size, settings_dict.get('POOL_MAX_LIFETIME') or 300)
+        return pool
+
+
+def connection_stats():
+    """{alias: {'opened', 'reused', 'closed', 'expired', 'health_check_failures', 'idle'}} для текущего процесса."""
+    result = {}
+    for alias, stats in list(_stats.items()):
+        pool = _pools.get(alias)
+        result[alias] = {**{name: stats[name] for name in ('opened', 'reused', 'closed', 'expired', 'health_check_failures')},
+                         'idle': pool.idle() if pool else 0}
+    return result
+
+
+class PooledConnectionMixin:
+    def ping_connection(self, connection):
+        raise NotImplementedError
+
+    def _pool_stats(self):
+        return _stats.setdefault(self.alias, Counter())
+
+    def get_new_connection(self, conn_params):
+        stats = self._pool_stats()
+        pool = get_pool(self.alias, self.settings_dict)
+        item = pool.acquire(self.ping_connection, stats) if pool else None
+        if item is not None:
+            connection, self._pool_created = item
+            return connection
+        connection = super().get_new_connection(conn_params)
+        stats['opened'] += 1
+        self._pool_created = time.monotonic()
+        return connection
+
+    def _close(self):
+        pool = get_pool(self.alias, self.settings_dict)
+        # Соединение внутри atomic() или с незавершенной транзакцией в пул не попадает
+        if pool is not None and self.connection is not None and not self.in_atomic_block:
+            try:
+                if not self.get_autocommit(): self.connection.rollback()
+                if pool.release(self.connection, self._pool_created): return
+            except Exception:
+                pass
+        self._pool_stats()['closed'] += 1
+        super()._close()
@@ -0,0 +1,9 @@
+from django.db.backends.sqlite3 import base
+
+from api.db.pooling import PooledConnectionMixin
+
+
+class DatabaseWrapper(PooledConnectionMixin, base.DatabaseWrapper):
+    # ENGINE = 'api.db.sqlite3': то же для SQLite - локальная замена MySQL при проверке пула и статистики
+    def ping_connection(self, connection):
+        connection.execute('SELECT 1')
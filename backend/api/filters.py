@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+
+def integer(value):
+    if not value.strip().isdigit(): raise ValueError('expected an integer id')
+    return int(value)
+
+
+def integer_list(value):
+    return [integer(item) for item in value.split(',') if item.strip()]
+
+
+def choice_list(choices):
+    allowed = {key for key, _ in choices}
+    def parse(value):
+        values = [item.strip() for item in value.split(',') if item.strip()]
+        if not values or set(values) - allowed: raise ValueError(f"allowed values: {', '.join(sorted(allowed))}")
+        return values
+    return parse
+
+
+def moment(value):
+    # Принимает ISO datetime или просто дату (начало дня в текущем часовом поясе)
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None: raise ValueError('expected ISO date or datetime')
+        parsed = datetime.combine(day, datetime.min.time())
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def next_day(value):
+    # Включительная граница по дате: "по 31.01" = created_at < начала 01.02
+    day = parse_date(value)
+    if day is None: raise ValueError('expected ISO date')
+    return timezone.make_aware(datetime.combine(day + timedelta(days=1), datetime.min.time()))
+
+
+class DeclarativeFilterBackend(BaseFilterBackend):
+    # Фильтры объявляются на вьюсете: filter_fields = {'param': ('lookup', parser)} или {'param': (callable(qs, value), parser)}
+    def filter_queryset(self, request, queryset, view):
+        for param, (lookup, parse) in getattr(view, 'filter_fields', {}).items():
+            raw = request.query_params.get(param)
+            if raw in (None, ''): continue
+            try:
+                value = parse(raw)
+            except (TypeError, ValueError) as e:
+                raise ValidationError({param: f"Invalid value '{raw}'" + (f": {e}" if str(e) else '')})
+            queryset = lookup(queryset, value) if callable(lookup) else queryset.filter(**{lookup: value})
+        return queryset
+
+
+class IndexedOrderingFilter(OrderingFilter):
+    # В отличие от OrderingFilter, неизвестные ключи не игнорируются, а отклоняются: сортировать можно
+    # только по полям из ordering_fields вьюсета, каждое из которых покрыто индексом.
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        allowed = set(getattr(view, 'ordering_fields', []))
+        invalid = [field for field in fields if field.lstrip('-') not in allowed]
+        if invalid:
+            raise ValidationError({self.ordering_param: f"Unsupported ordering: {', '.join(invalid)}. Allowed: {', '.join(sorted(allowed))}"})
+        return fields
+
+    def get_ordering(self, request, queryset, view):
+        ordering = list(super().get_ordering(request, queryset, view) or [])
+        # id как tie-breaker: стабильный порядок для курсорной пагинации
+        if ordering and ordering[-1].lstrip('-') != 'id':
+            ordering.append('-id' if ordering[0].startswith('-') else 'id')
+        return ordering
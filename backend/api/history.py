@@ -0,0 +1,82 @@
+from django.contrib.auth.models import User
+
+from .models import ProjectStage, Tag, Ticket, TicketHistory
+
+TRACKED_FIELDS = ['title', 'status', 'priority', 'assignee', 'stage', 'due_date', 'tags']
+FIELD_LABELS = {
+    'title': 'название', 'status': 'статус', 'priority': 'приоритет', 'assignee': 'исполнителя',
+    'stage': 'этап', 'due_date': 'срок', 'tags': 'теги',
+}
+RELATED_NAMES = {'assignee': (User, 'username'), 'stage': (ProjectStage, 'name'), 'tags': (Tag, 'name')}
+
+
+class TicketChangeTracker:
+    # Снимок отслеживаемых полей уже загруженной задачи до сохранения; после сохранения отдает дифф
+    # и строит структурированные записи TicketHistory (field, old_value, new_value) для одного bulk_create.
+
+    def __init__(self, ticket, fields=TRACKED_FIELDS):
+        self.ticket = ticket
+        self.fields = [field for field in TRACKED_FIELDS if field in fields]
+        self.before = self._snapshot()
+
+    def _snapshot(self):
+        values = {}
+        for field in self.fields:
+            if field == 'tags':
+                values[field] = tuple(sorted(tag.id for tag in self.ticket.tags.all()))
+            else:
+                values[field] = getattr(self.ticket, Ticket._meta.get_field(field).attname)
+        return values
+
+    def changes(self):
+        after = self._snapshot()
+        return [(field, self.before[field], after[field]) for field in self.fields if self.before[field] != after[field]]
+
+    def history_rows(self, user, changes):
+        return build_history_rows(user, [(self.ticket, changes)])
+
+
+def build_history_rows(user, items):
+    # items - [(ticket, changes)]; имена связанных объектов грузятся один раз на всю пачку задач
+    names = _related_names([change for _, changes in items for change in changes])
+    rows = []
+    for ticket, changes in items:
+        for field, old, new in changes:
+            if field == 'tags':
+                added = [names['tags'].get(i, str(i)) for i in new if i not in old]
+                removed = [names['tags'].get(i, str(i)) for i in old if i not in new]
+                text = ', '.join(filter(None, [added and 'добавил ' + ', '.join(added), removed and 'убрал ' + ', '.join(removed)]))
+                action = f"Изменил теги: {text}"
+            else:
+                action = f"Изменил {FIELD_LABELS[field]} с '{_display(field, old, names)}' на '{_display(field, new, names)}'"
+            rows.append(TicketHistory(ticket=ticket, user=user, action=action[:255], field=field,
+                                      old_value=_raw(old), new_value=_raw(new)))
+    return rows
+
+
+def _related_names(changes):
+    # Имена связанных объектов - одним запросом на модель, только для реально изменившихся полей
+    ids = {}
+    for field, old, new in changes:
+        if field in RELATED_NAMES:
+            ids.setdefault(field, set()).update(set(old + new) if field == 'tags' else {old, new} - {None})
+    names = {}
+    for field, values in ids.items():
+        model, attr = RELATED_NAMES[field]
+        names[field] = dict(model.objects.filter(id__in=values).values_list('id', attr))
+    return names
+
+
+def _display(field, value, names):
+    if value is None or value == '': return 'не задан'
+    if field in ('status', 'priority'): return dict(Ticket._meta.get_field(field).choices).get(value, value)
+    if field in names: return names[field].get(value, value)
+    if field == 'due_date': return value.strftime('%d.%m.%Y %H:%M')
+    return value
+
+
+def _raw(value):
+    if value is None: return None
+    if isinstance(value, tuple): return ','.join(map(str, value))
+    if hasattr(value, 'isoformat'): return value.isoformat()
+    return str(value)
@@ -0,0 +1,73 @@
+import json
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from api import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный прогон основных списков API на синтетических данных во временной тестовой базе: '
+            'перцентили времени ответа и число SQL-запросов; ошибка при превышении бюджетов API_BENCHMARK_BUDGETS')
+
+    def add_arguments(self, parser):
+        for name, default in benchmark.DEFAULT_SCALE.items():
+            help_text = 'Этапов на проект' if name == 'stages' else f'Сколько создать: {name}'
+            parser.add_argument(f'--{name}', type=int, default=default, help=help_text)
+        parser.add_argument('--iterations', type=int, default=20, help='Замеров на адрес')
+        parser.add_argument('--warmup', type=int, default=2, help='Прогревочных запросов на адрес (не учитываются)')
+        parser.add_argument('--endpoint', action='append', choices=list(benchmark.ENDPOINTS), dest='endpoints',
+                            help='Прогнать только этот адрес (можно несколько раз)')
+        parser.add_argument('--seed', type=int, default=0, help='Зерно генератора данных')
+        parser.add_argument('--budgets', help='JSON-файл с бюджетами вместо API_BENCHMARK_BUDGETS')
+        parser.add_argument('--no-latency-budget', action='store_true',
+                            help='Проверять только число запросов (время ответа зависит от машины)')
+        parser.add_argument('--no-plan-check', action='store_true',
+                            help='Не проверять планы горячих запросов (check_query_plans) на засеянной базе')
+        parser.add_argument('--json', dest='json_path', help='Записать результаты в JSON-файл')
+        parser.add_argument('--keepdb', action='store_true', help='Не удалять тестовую базу после прогона')
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive',
+                            help='Не спрашивать перед удалением существующей тестовой базы')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1: raise CommandError('--iterations must be positive.')
+        scale = {name: max(options[name], 0) for name in benchmark.DEFAULT_SCALE}
+        endpoints = {name: url for name, url in benchmark.ENDPOINTS.items() if not options['endpoints'] or name in options['endpoints']}
+        budgets = settings.API_BENCHMARK_BUDGETS
+        if options['budgets']:
+            with open(options['budgets'], encoding='utf-8') as f:
+                budgets = json.load(f)
+
+        # Как manage.py test: отдельная база test_<NAME>, рабочие данные не трогаются
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=not options['interactive'], serialize=False, keepdb=options['keepdb'])
+        try:
+            user = benchmark.seed(scale, options['seed'])
+            self.stdout.write(f"Данные: {', '.join(f'{name}={value}' for name, value in scale.items())}")
+            results = benchmark.run(user, endpoints, options['iterations'], options['warmup'])
+            # Планы EXPLAIN проверяются на тех же данных: на пустой базе планировщик может выбрать другой индекс
+            plan_error = None
+            if not options['no_plan_check']:
+                try: call_command('check_query_plans', stdout=self.stdout, verbosity=options['verbosity'])
+                except CommandError as e: plan_error = str(e)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        self.stdout.write(f"{'endpoint':<16}{'queries':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'KB':>8}")
+        for name, result in results.items():
+            self.stdout.write(f"{name:<16}{result['queries']:>8}{result['p50_ms']:>9}{result['p95_ms']:>9}"
+                              f"{result['p99_ms']:>9}{result['max_ms']:>9}{result['bytes'] // 1024:>8}")
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump({'scale': scale, 'iterations': options['iterations'], 'results': results}, f, indent=2)
+
+        violations = benchmark.check_budgets(results, budgets, latency=not options['no_latency_budget'])
+        if plan_error: violations.append(plan_error)
+        if violations:
+            raise CommandError('Budget exceeded:\n' + '\n'.join(violations))
+        self.stdout.write(self.style.SUCCESS('Бюджеты соблюдены'))
@@ -0,0 +1,26 @@
+import os
+import secrets
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Создает суперпользователя, если его еще нет; повторный запуск ничего не меняет. Раньше это делал ApiConfig.ready при каждом старте'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', default=os.environ.get('ADMIN_USERNAME', 'admin'))
+        parser.add_argument('--email', default=os.environ.get('ADMIN_EMAIL', 'admin@example.com'))
+        parser.add_argument('--password', default=os.environ.get('ADMIN_PASSWORD'),
+                            help='По умолчанию ADMIN_PASSWORD; если не задан - генерируется и печатается один раз')
+
+    def handle(self, *args, username, email, password, **options):
+        User = get_user_model()
+        if User.objects.filter(username=username).exists():
+            self.stdout.write(f"Пользователь {username} уже существует")
+            return
+        generated = not password
+        if generated: password = secrets.token_urlsafe(12)
+        User.objects.create_superuser(username, email, password)
+        self.stdout.write(self.style.SUCCESS(f"Суперпользователь {username} создан"))
+        if generated: self.stdout.write(f"Пароль: {password}")
@@ -0,0 +1,27 @@
+import hashlib
+
+from django.core.management.base import BaseCommand
+
+from api.avatars import build_variants
+from api.models import Profile
+
+
+class Command(BaseCommand):
+    help = 'Считает хеши аватаров, загруженных до появления уменьшенных копий, и строит сами копии'
+
+    def handle(self, *args, **options):
+        built = failed = 0
+        for profile in Profile.objects.exclude(avatar='').exclude(avatar__isnull=True).iterator():
+            if not profile.avatar_hash:
+                digest = hashlib.sha256()
+                try:
+                    with profile.avatar.open('rb') as source:
+                        for chunk in source.chunks(): digest.update(chunk)
+                except OSError:
+                    failed += 1
+                    continue
+                profile.avatar_hash = digest.hexdigest()
+                Profile.objects.filter(pk=profile.pk).update(avatar_hash=profile.avatar_hash)
+            if build_variants(profile): built += 1
+            else: failed += 1
+        self.stdout.write(self.style.SUCCESS(f'Аватаров обработано: {built}, не удалось прочитать: {failed}'))
@@ -0,0 +1,56 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from api.db.pooling import connection_stats
+
+
+class Command(BaseCommand):
+    help = ('Проверяет настройки соединений с БД: имитирует многопоточный воркер (запрос + закрытие в конце, как в Django) '
+            'и печатает, сколько раз подключались заново и сколько соединений переиспользовано')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Потоков-обработчиков')
+        parser.add_argument('--requests', type=int, default=50, help='Запросов на поток')
+
+    def handle(self, *args, **options):
+        db = settings.DATABASES['default']
+        self.stdout.write(f"ENGINE={db['ENGINE']} CONN_MAX_AGE={db['CONN_MAX_AGE']} CONN_HEALTH_CHECKS={db['CONN_HEALTH_CHECKS']} "
+                          f"POOL_SIZE={db.get('POOL_SIZE', 0)} POOL_MAX_LIFETIME={db.get('POOL_MAX_LIFETIME')}")
+        if connection.vendor == 'mysql':
+            with connection.cursor() as cursor:
+                variable = 'max_statement_time' if connection.mysql_is_mariadb else 'max_execution_time'
+                cursor.execute(f'SELECT @@SESSION.{variable}')
+                self.stdout.write(f'{variable}={cursor.fetchone()[0]}')
+        connection.close()
+
+        timings = []
+        lock = threading.Lock()
+
+        def worker():
+            for _ in range(options['requests']):
+                started = time.perf_counter()
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                    cursor.fetchone()
+                # То же, что обработчик request_finished: закрыть (или вернуть в пул) устаревшее соединение
+                close_old_connections()
+                with lock: timings.append(time.perf_counter() - started)
+            connection.close()
+
+        before = connection_stats().get('default', {})
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        after = connection_stats().get('default', {})
+
+        delta = {key: after.get(key, 0) - before.get(key, 0) for key in ('opened', 'reused', 'closed', 'expired', 'health_check_failures')}
+        total = len(timings)
+        timings.sort()
+        self.stdout.write(f"Запросов: {total}, подключений: {delta['opened']}, из пула: {delta['reused']}, закрыто: {delta['closed']}, "
+                          f"просрочено: {delta['expired']}, не прошли проверку: {delta['health_check_failures']}, в пуле: {after.get('idle', 0)}")
+        self.stdout.write(f'Время запроса с подключением: p50 {1000 * timings[total // 2]:.2f} ms, max {1000 * timings[-1]:.2f} ms')
+        self.stdout.write(self.style.SUCCESS(f"Переиспользовано соединений: {100 * (1 - delta['opened'] / total):.0f}%"))
@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from api.models import Notification, Ticket, TimeTrack, WorkLog
+
+
+class Command(BaseCommand):
+    help = 'Проверяет через EXPLAIN, что горячие запросы используют составные индексы api.models'
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=1)
+        # (описание, queryset, индекс, который должен выбрать планировщик)
+        checks = [
+            ('Ticket: мои активные задачи', Ticket.objects.filter(assignee_id=1, status='OPEN'), 'ticket_assignee_status_idx'),
+            ('Ticket: закрытые за месяц', Ticket.objects.filter(status='DONE', updated_at__gte=since), 'ticket_status_updated_idx'),
+            ('Ticket: лента задач проекта', Ticket.objects.filter(project_id=1).order_by('-created_at')[:50], 'ticket_project_created_idx'),
+            ('WorkLog: время за день', WorkLog.objects.filter(user_id=1, created_at__gte=since), 'worklog_user_created_idx'),
+            ('Notification: лента пользователя', Notification.objects.filter(user_id=1).order_by('-created_at')[:50], 'notif_user_created_idx'),
+            ('Notification: счетчик непрочитанных', Notification.objects.filter(user_id=1, is_read=False).values('id'), 'notif_user_read_created_idx'),
+        ]
+        if connection.features.supports_partial_indexes:
+            checks.append(('TimeTrack: открытый таймер', TimeTrack.objects.filter(user_id=1, end_time__isnull=True), 'timetrack_one_open_per_user'))
+
+        failed = []
+        for title, qs, index_name in checks:
+            plan = qs.explain()
+            used = index_name in plan
+            self.stdout.write(f"{'OK ' if used else 'FAIL'} {title}: {index_name}")
+            if options['verbosity'] > 1: self.stdout.write(f"     {plan}")
+            if not used: failed.append(index_name)
+        if failed:
+            raise CommandError(f"Планировщик не использует индексы: {', '.join(failed)}")
@@ -0,0 +1,30 @@
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.attachments import abort_upload, upload_temp_path
+from api.models import AttachmentUpload
+
+
+class Command(BaseCommand):
+    help = 'Удаляет брошенные загрузки вложений по частям и их временные файлы (запускать по cron)'
+
+    def handle(self, *args, **options):
+        expired = timezone.now() - timedelta(hours=settings.ATTACHMENT_UPLOAD_EXPIRY_HOURS)
+        removed = 0
+        for upload in AttachmentUpload.objects.filter(updated_at__lt=expired).iterator():
+            abort_upload(upload)
+            removed += 1
+        # Временные файлы без записи о загрузке (например, после падения процесса)
+        orphans = 0
+        if os.path.isdir(settings.ATTACHMENT_UPLOAD_TEMP_DIR):
+            known = {os.path.basename(upload_temp_path(upload)) for upload in AttachmentUpload.objects.only('id')}
+            for name in os.listdir(settings.ATTACHMENT_UPLOAD_TEMP_DIR):
+                path = os.path.join(settings.ATTACHMENT_UPLOAD_TEMP_DIR, name)
+                if name not in known and os.path.getmtime(path) < expired.timestamp():
+                    os.remove(path)
+                    orphans += 1
+        self.stdout.write(self.style.SUCCESS(f'Удалено загрузок: {removed}, временных файлов без загрузки: {orphans}'))
@@ -0,0 +1,71 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Скрипт для чистого интерпретатора: импорт config.wsgi (STARTUP_PROFILE=1) и несколько запросов через WSGI
+SCRIPT = '''
+import io, json, sys, time
+started = time.perf_counter()
+import config.wsgi
+loaded = time.perf_counter()
+from django.db import connection
+db_at_startup = connection.connection is not None
+timings = []
+for _ in range({requests}):
+    environ = {{'REQUEST_METHOD': 'GET', 'PATH_INFO': {path!r}, 'QUERY_STRING': '', 'SERVER_NAME': 'localhost',
+               'SERVER_PORT': '80', 'HTTP_HOST': 'localhost', 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+               'wsgi.errors': sys.stderr}}
+    status = []
+    request_started = time.perf_counter()
+    b''.join(config.wsgi.application(environ, lambda code, headers, exc_info=None: status.append(code)))
+    timings.append((status[0], 1000 * (time.perf_counter() - request_started)))
+print('STARTUP_PROFILE ' + json.dumps({{'import_ms': 1000 * (loaded - started), 'db_at_startup': db_at_startup, 'requests': timings}}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Замеряет холодный старт: импорт config.wsgi и первые запросы в новом процессе, плюс самые тяжелые импорты'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/', help='URL для тестовых запросов (по умолчанию /api/)')
+        parser.add_argument('--requests', type=int, default=3)
+        parser.add_argument('--runs', type=int, default=5, help='Сколько раз запустить процесс; берется медиана')
+        parser.add_argument('--top', type=int, default=15, help='Сколько самых тяжелых пакетов показать')
+
+    def handle(self, *args, path, requests, runs, top, **options):
+        env = dict(os.environ, STARTUP_PROFILE='1', DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'config.settings'),
+                   PYTHONPATH=os.pathsep.join(filter(None, [str(settings.BASE_DIR), os.environ.get('PYTHONPATH')])))
+        results, packages = [], defaultdict(int)
+        # Замеры - без -X importtime (он заметно замедляет импорт); разбивка по пакетам - отдельным прогоном
+        for run in range(runs + 1):
+            profile_imports = run == runs
+            command = [sys.executable, *(['-X', 'importtime'] if profile_imports else []), '-c', SCRIPT.format(path=path, requests=requests)]
+            process = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+            line = next((line for line in process.stdout.splitlines() if line.startswith('STARTUP_PROFILE ')), None)
+            if line is None:
+                self.stderr.write(process.stderr[-2000:])
+                return
+            if not profile_imports:
+                results.append(json.loads(line[len('STARTUP_PROFILE '):]))
+                continue
+            # Собственное время модулей, сгруппированное по пакету верхнего уровня
+            for row in process.stderr.splitlines():
+                parts = row.split('|')
+                if len(parts) == 3 and parts[0].startswith('import time:') and parts[0].split(':')[1].strip().isdigit():
+                    packages[parts[2].strip().split('.')[0]] += int(parts[0].split(':')[1]) / 1000
+
+        median = lambda values: sorted(values)[len(values) // 2]
+        self.stdout.write(f"import config.wsgi: {median([r['import_ms'] for r in results]):.0f} ms (медиана из {runs})")
+        self.stdout.write(f"подключение к БД при старте: {'да' if any(r['db_at_startup'] for r in results) else 'нет'}")
+        for index in range(requests):
+            status = results[0]['requests'][index][0]
+            self.stdout.write(f"запрос #{index + 1} {path}: {median([r['requests'][index][1] for r in results]):.1f} ms ({status})")
+        self.stdout.write('самые тяжелые импорты (собственное время под -X importtime, ms):')
+        for package, milliseconds in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+            self.stdout.write(f"  {package:<28} {milliseconds:8.1f}")
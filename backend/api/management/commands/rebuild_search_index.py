@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Строит поисковый индекс задач: FTS5-таблицу на SQLite или FULLTEXT-индексы на MySQL'
+
+    def handle(self, *args, **options):
+        indexed = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Поисковый индекс построен: {indexed} задач'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+from api.models import TimeRollup, WorkLog
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает TimeRollup с нуля по всем записям WorkLog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        rows = WorkLog.objects.annotate(day=TruncDate('created_at')).values(
+            'ticket_id', 'user_id', 'work_type_id', 'day',
+            stage_id=F('ticket__stage_id'), project_id=F('ticket__project_id'),
+        ).annotate(
+            minutes=Sum('time_spent_minutes'), seconds=Sum('time_spent_seconds'), logs_count=Count('id'),
+        ).order_by()
+
+        created = 0
+        with transaction.atomic():
+            TimeRollup.objects.all().delete()
+            batch = []
+            for row in rows.iterator(chunk_size=batch_size):
+                batch.append(TimeRollup(**row, stage_key=row['stage_id'] or 0, work_type_key=row['work_type_id'] or 0))
+                if len(batch) >= batch_size:
+                    created += len(TimeRollup.objects.bulk_create(batch))
+                    batch = []
+            created += len(TimeRollup.objects.bulk_create(batch))
+        self.stdout.write(self.style.SUCCESS(f'TimeRollup пересчитан: {created} строк'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.progress import take_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Записывает дневной срез счетчиков активных этапов и невыпущенных релизов для burndown (запускать по cron раз в день)'
+
+    def handle(self, *args, **options):
+        stages, releases = take_snapshot()
+        self.stdout.write(self.style.SUCCESS(f'Срез записан: этапов {stages}, релизов {releases}'))
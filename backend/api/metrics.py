@@ -0,0 +1,164 @@
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import ExitStack
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .db.pooling import connection_stats
+
+# Метрики запросов: число SQL-запросов и время в БД (через connection.execute_wrapper) и общее время ответа.
+# Гистограммы копятся в памяти процесса по маршрутам (view_name) - каждый воркер отдает на /api/_metrics/ свои,
+# Prometheus суммирует их сам. Модели здесь не импортируются: модуль подключается из LOGGING до загрузки приложений.
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин: секунды для времени, штуки для запросов
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+HISTOGRAMS = (
+    ('http_request_duration_seconds', 'Time until the response is returned (streamed bodies excluded)', DURATION_BUCKETS),
+    ('http_request_db_duration_seconds', 'Total SQL time per request', DURATION_BUCKETS),
+    ('http_request_db_queries', 'SQL queries per request', QUERY_BUCKETS),
+)
+
+DB_CONNECTION_METRICS = (
+    ('opened', 'counter', 'New physical database connections'),
+    ('reused', 'counter', 'Connections handed out again from the process pool'),
+    ('closed', 'counter', 'Physically closed connections'),
+    ('expired', 'counter', 'Pooled connections dropped after POOL_MAX_LIFETIME'),
+    ('health_check_failures', 'counter', 'Pooled connections that failed the ping before reuse'),
+    ('idle', 'gauge', 'Idle connections in the process pool'),
+)
+
+# Форма запроса для поиска N+1: списки IN (%s, %s, ...) и числа в тексте SQL не различаются
+IN_LIST_RE = re.compile(r'\((?:%s, )*%s\)')
+NUMBER_RE = re.compile(r'\b\d+\b')
+
+
+class RotatingLogFileHandler(RotatingFileHandler):
+    # Каталог журнала создается при первой записи, а не при настройке логирования
+    def _open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.baseFilename)), exist_ok=True)
+        return super()._open()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+_lock = threading.Lock()
+_routes = {}
+_responses = Counter()
+
+
+def observe(route, method, status_code, duration, db_duration, queries):
+    with _lock:
+        histograms = _routes.get((route, method))
+        if histograms is None:
+            histograms = _routes[(route, method)] = [Histogram(buckets) for _, _, buckets in HISTOGRAMS]
+        for histogram, value in zip(histograms, (duration, db_duration, queries)):
+            histogram.observe(value)
+        _responses[(route, method, status_code)] += 1
+
+
+def _labels(**labels):
+    def escape(value): return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def render_prometheus():
+    """Гистограммы и счетчик ответов в текстовом формате Prometheus 0.0.4."""
+    with _lock:
+        routes = {key: [(list(h.counts), h.sum, h.count) for h in histograms] for key, histograms in _routes.items()}
+        responses = dict(_responses)
+    lines = ['# HELP http_responses_total Responses by route, method and status', '# TYPE http_responses_total counter']
+    for (route, method, status_code), value in sorted(responses.items()):
+        lines.append(f'http_responses_total{_labels(route=route, method=method, status=status_code)} {value}')
+    for i, (name, description, buckets) in enumerate(HISTOGRAMS):
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+        for (route, method), histograms in sorted(routes.items()):
+            counts, total, count = histograms[i]
+            cumulative = 0
+            for bound, value in zip((*buckets, '+Inf'), counts):
+                cumulative += value
+                lines.append(f'{name}_bucket{_labels(route=route, method=method, le=bound)} {cumulative}')
+            lines.append(f'{name}_sum{_labels(route=route, method=method)} {round(total, 6)}')
+            lines.append(f'{name}_count{_labels(route=route, method=method)} {count}')
+    # Переиспользование соединений (api/db/pooling.py): opened растет только при настоящем подключении к серверу
+    stats = connection_stats()
+    for key, metric_type, description in DB_CONNECTION_METRICS:
+        name = 'db_pool_idle_connections' if key == 'idle' else f'db_connections_{key}_total'
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} {metric_type}']
+        for alias, values in sorted(stats.items()):
+            lines.append(f'{name}{_labels(alias=alias)} {values[key]}')
+    return '\n'.join(lines) + '\n'
+
+
+class QueryStats:
+    # execute_wrapper: считает запросы, их время и повторы одного и того же текста SQL
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    def repeated_shape(self):
+        # Самая частая форма запроса и сколько раз она выполнилась; нормализуются только различные тексты
+        shapes = Counter()
+        for sql, count in self.statements.items():
+            shapes[NUMBER_RE.sub('N', IN_LIST_RE.sub('(...)', sql))] += count
+        return shapes.most_common(1)[0] if shapes else (None, 0)
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_METRICS_ENABLED', True): raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        # Неразрешенные адреса (404 мимо urls) сводятся в одну метку, чтобы не плодить маршруты
+        route = request.resolver_match.view_name if request.resolver_match else '<unresolved>'
+        observe(route, request.method, response.status_code, duration, stats.duration, stats.count)
+        response['Server-Timing'] = f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries", app;dur={duration * 1000:.1f}'
+
+        if duration * 1000 >= settings.REQUEST_SLOW_MS:
+            logger.warning('slow %s %s [%s] %d: %.0f ms, %d queries, db %.0f ms', request.method, request.get_full_path(),
+                           route, response.status_code, duration * 1000, stats.count, stats.duration * 1000)
+        shape, repeats = stats.repeated_shape()
+        if repeats >= settings.REQUEST_N_PLUS_ONE_THRESHOLD:
+            logger.warning('n+1 %s %s [%s]: %d of %d queries are %s', request.method, request.get_full_path(),
+                           route, repeats, stats.count, shape[:1000])
+        return response
@@ -1,6 +1,13 @@
-from django.db import models
+import hashlib
+import uuid
+from datetime import timedelta
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Func, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.utils import timezone
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
 from django.dispatch import receiver
 
 class Department(models.Model):
@@ -34,6 +41,8 @@ class Profile(models.Model):
     ]
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    # sha256 исходного аватара: из него строятся имена уменьшенных копий (api/avatars.py)
+    avatar_hash = models.CharField(max_length=64, blank=True, db_index=True)
     bio = models.TextField(blank=True)
     
     departments = models.ManyToManyField(Department, through='ProfileDepartment', blank=True)
@@ -47,6 +56,16 @@ class Profile(models.Model):
 
     def __str__(self): return f"Профиль {self.user.username}"
 
+    def save(self, *args, **kwargs):
+        # Хеш считается только для только что загруженного файла (_committed=False), обычные сохранения его не трогают
+        if self.avatar and not self.avatar._committed:
+            digest = hashlib.sha256()
+            for chunk in self.avatar.chunks(): digest.update(chunk)
+            self.avatar_hash = digest.hexdigest()
+        elif not self.avatar:
+            self.avatar_hash = ''
+        super().save(*args, **kwargs)
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created: Profile.objects.create(user=instance)
@@ -62,6 +81,47 @@ class ProfileSkill(models.Model):
     level = models.CharField(max_length=20, choices=LEVEL_CHOICES, default='BASIC')
     class Meta: unique_together = ('profile', 'skill')
 
+OPEN_TICKET_STATUSES = ['OPEN', 'IN_PROGRESS', 'REVIEW']
+
+def _subquery_aggregate(qs, function, field='pk'):
+    # Коррелированный подзапрос без GROUP BY: SELECT COUNT/SUM(...) ... WHERE fk = внешний pk
+    expr = Func(F(field), function=function, output_field=IntegerField())
+    return Coalesce(Subquery(qs.order_by().annotate(_value=expr).values('_value')[:1]), 0)
+
+class ProjectQuerySet(models.QuerySet):
+    def with_stats(self):
+        month_start = timezone.localdate().replace(day=1)
+        tickets = Ticket.objects.filter(project=OuterRef('pk'))
+        stages = ProjectStage.objects.filter(project=OuterRef('pk'))
+        rollups = TimeRollup.objects.filter(project=OuterRef('pk'))
+        return self.annotate(
+            open_tickets_count=_subquery_aggregate(tickets.filter(status__in=OPEN_TICKET_STATUSES), 'COUNT'),
+            total_tickets_count=_subquery_aggregate(tickets, 'COUNT'),
+            active_stages_count=_subquery_aggregate(stages.filter(status='ACTIVE'), 'COUNT'),
+            total_stages_count=_subquery_aggregate(stages, 'COUNT'),
+            spent_minutes_month=_subquery_aggregate(rollups.filter(day__gte=month_start), 'SUM', 'minutes'),
+            total_spent_minutes=_subquery_aggregate(rollups, 'SUM', 'minutes'),
+        )
+
+class ProjectStageQuerySet(models.QuerySet):
+    def with_stats(self):
+        tickets = Ticket.objects.filter(stage=OuterRef('pk'))
+        return self.annotate(
+            open_tickets_count=_subquery_aggregate(tickets.filter(status__in=OPEN_TICKET_STATUSES), 'COUNT'),
+            total_tickets_count=_subquery_aggregate(tickets, 'COUNT'),
+            done_tickets_count=_subquery_aggregate(tickets.filter(status='DONE'), 'COUNT'),
+            spent_minutes=_subquery_aggregate(TimeRollup.objects.filter(stage=OuterRef('pk')), 'SUM', 'minutes'),
+        )
+
+def with_user_workload(qs):
+    # User - модель auth, свой QuerySet к ней не подключить: нагрузка сотрудника теми же подзапросами, что и with_stats()
+    today = timezone.localdate()
+    week_start = today - timedelta(days=today.weekday())
+    return qs.annotate(
+        active_tickets_count=_subquery_aggregate(Ticket.objects.filter(assignee=OuterRef('pk'), status__in=OPEN_TICKET_STATUSES), 'COUNT'),
+        week_minutes=_subquery_aggregate(TimeRollup.objects.filter(user=OuterRef('pk'), day__gte=week_start), 'SUM', 'minutes'),
+    )
+
 class Project(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
@@ -74,6 +134,7 @@ class Project(models.Model):
     website_link = models.URLField(max_length=200, blank=True, null=True)
     gitlab_link = models.URLField(max_length=200, blank=True, null=True)
     figma_link = models.URLField(max_length=200, blank=True, null=True)
+    objects = ProjectQuerySet.as_manager()
     def __str__(self): return self.name
 
 class ProjectStage(models.Model):
@@ -85,6 +146,7 @@ class ProjectStage(models.Model):
     priority = models.CharField(max_length=20, choices=[('LOW', 'Низкий'), ('MEDIUM', 'Средний'), ('HIGH', 'Высокий'), ('CRITICAL', 'Критический')], default='MEDIUM')
     deadline = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    objects = ProjectStageQuerySet.as_manager()
     def __str__(self): return f"{self.project.name} - {self.name}"
 
 class ProjectRelease(models.Model):
@@ -113,16 +175,40 @@ class Ticket(models.Model):
     creator = models.ForeignKey(User, related_name='created_tickets', on_delete=models.CASCADE)
     assignee = models.ForeignKey(User, related_name='assigned_tickets', on_delete=models.SET_NULL, null=True, blank=True)
     tags = models.ManyToManyField(Tag, blank=True)
+    watchers = models.ManyToManyField(User, related_name='watched_tickets', blank=True)
     due_date = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['assignee', 'status'], name='ticket_assignee_status_idx'),
+            models.Index(fields=['status', 'updated_at'], name='ticket_status_updated_idx'),
+            models.Index(fields=['project', 'created_at'], name='ticket_project_created_idx'),
+            models.Index(fields=['created_at'], name='ticket_created_idx'),
+            models.Index(fields=['updated_at'], name='ticket_updated_idx'),
+            models.Index(fields=['due_date'], name='ticket_due_date_idx'),
+        ]
+
     def __str__(self): return self.title
 
+class TicketTombstone(models.Model):
+    # След удаленной задачи для /api/tickets/changes/ - клиенты убирают ее из локальной копии доски
+    ticket_id = models.BigIntegerField()
+    project_id = models.BigIntegerField(null=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    class Meta: indexes = [models.Index(fields=['deleted_at'], name='tombstone_deleted_idx')]
+
+@receiver(post_delete, sender=Ticket)
+def create_ticket_tombstone(sender, instance, **kwargs):
+    TicketTombstone.objects.create(ticket_id=instance.id, project_id=instance.project_id)
+
 class TicketComment(models.Model):
     ticket = models.ForeignKey(Ticket, related_name='comments', on_delete=models.CASCADE)
     author = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    class Meta: indexes = [models.Index(fields=['created_at'], name='comment_created_idx')]
 
 class TicketNote(models.Model):
     ticket = models.ForeignKey(Ticket, related_name='notes', on_delete=models.CASCADE)
@@ -134,6 +220,9 @@ class TicketHistory(models.Model):
     ticket = models.ForeignKey(Ticket, related_name='history', on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     action = models.CharField(max_length=255)
+    field = models.CharField(max_length=50, blank=True)
+    old_value = models.TextField(null=True, blank=True)
+    new_value = models.TextField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
 class TicketAttachment(models.Model):
@@ -141,11 +230,30 @@ class TicketAttachment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     file = models.FileField(upload_to='attachments/')
     filename = models.CharField(max_length=255, blank=True)
+    # sha256 содержимого: одинаковые файлы хранятся один раз (api/attachments.py), он же ETag при скачивании.
+    # Пусто у вложений, загруженных до хранения по хешу
+    sha256 = models.CharField(max_length=64, blank=True)
+    size = models.BigIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['sha256'], name='attachment_sha256_idx')]
+
     def save(self, *args, **kwargs):
         if self.file and not self.filename: self.filename = self.file.name
         super().save(*args, **kwargs)
 
+class AttachmentUpload(models.Model):
+    # Незавершенная загрузка по частям: части дописываются во временный файл, offset - сколько байт уже принято
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    ticket = models.ForeignKey(Ticket, related_name='attachment_uploads', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name='attachment_uploads', on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
 class Notification(models.Model):
     user = models.ForeignKey(User, related_name='notifications', on_delete=models.CASCADE, null=True, blank=True)
     message = models.TextField()
@@ -153,6 +261,12 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'is_read', 'created_at'], name='notif_user_read_created_idx'),
+            models.Index(fields=['user', 'created_at'], name='notif_user_created_idx'),
+        ]
+
 class EventLabel(models.Model):
     name = models.CharField(max_length=50)
     color = models.CharField(max_length=20, default="#e5e7eb")
@@ -165,6 +279,7 @@ class CompanyEvent(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     label = models.ForeignKey(EventLabel, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    class Meta: indexes = [models.Index(fields=['created_at'], name='event_created_idx')]
 
 class WorkType(models.Model):
     name = models.CharField(max_length=100)
@@ -178,11 +293,155 @@ class WorkLog(models.Model):
     time_spent_minutes = models.IntegerField()
     time_spent_seconds = models.IntegerField(default=0)
     comment = models.TextField(blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # default вместо auto_now_add: загрузка из CSV (bulk_create) сохраняет дату из файла
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='worklog_user_created_idx'),
+            models.Index(fields=['created_at'], name='worklog_created_idx'),
+        ]
+
+class TimeRollup(models.Model):
+    # Предагрегированное время по (задача, этап, проект, сотрудник, тип работ, день); ведется сигналами WorkLog
+    ticket = models.ForeignKey(Ticket, related_name='time_rollups', on_delete=models.CASCADE)
+    stage = models.ForeignKey(ProjectStage, related_name='time_rollups', on_delete=models.SET_NULL, null=True, blank=True)
+    project = models.ForeignKey(Project, related_name='time_rollups', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name='time_rollups', on_delete=models.CASCADE)
+    work_type = models.ForeignKey(WorkType, on_delete=models.SET_NULL, null=True, blank=True)
+    day = models.DateField()
+    minutes = models.IntegerField(default=0)
+    seconds = models.IntegerField(default=0)
+    logs_count = models.IntegerField(default=0)
+    # stage_id / work_type_id или 0: NULL в уникальном ключе не совпадают, а индексы по выражениям есть не везде
+    stage_key = models.PositiveIntegerField(default=0)
+    work_type_key = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ticket', 'user', 'day'], name='rollup_ticket_user_day_idx'),
+            models.Index(fields=['project', 'day'], name='rollup_project_day_idx'),
+            models.Index(fields=['user', 'day'], name='rollup_user_day_idx'),
+            models.Index(fields=['day'], name='rollup_day_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['ticket', 'stage_key', 'project', 'user', 'work_type_key', 'day'], name='rollup_key_uniq'),
+        ]
+
+    @staticmethod
+    def key_lookup(key):
+        # Ключ с stage_id/work_type_id (как у WorkLog) -> поля уникального ограничения
+        lookup = {name: value for name, value in key.items() if name not in ('stage_id', 'work_type_id')}
+        return {**lookup, 'stage_key': key['stage_id'] or 0, 'work_type_key': key['work_type_id'] or 0}
+
+    @classmethod
+    def apply(cls, key, minutes, seconds, logs_count):
+        # UPDATE с F() атомарен сам по себе; строку, которую параллельное сохранение успело вставить первым,
+        # ловит уникальное ограничение - тогда прибавляем к ней
+        lookup = cls.key_lookup(key)
+        increment = {'minutes': F('minutes') + minutes, 'seconds': F('seconds') + seconds, 'logs_count': F('logs_count') + logs_count}
+        if not cls.objects.filter(**lookup).update(**increment):
+            if logs_count <= 0: return
+            try:
+                with transaction.atomic():
+                    cls.objects.create(minutes=minutes, seconds=seconds, logs_count=logs_count, **{**key, **lookup})
+                return
+            except IntegrityError:
+                cls.objects.filter(**lookup).update(**increment)
+        if logs_count < 0: cls.objects.filter(logs_count__lte=0, **lookup).delete()
+
+def _worklog_rollup_state(worklog):
+    if worklog.ticket_id is None or worklog.created_at is None: return None
+    if WorkLog.ticket.is_cached(worklog):
+        stage_id, project_id = worklog.ticket.stage_id, worklog.ticket.project_id
+    else:
+        row = Ticket.objects.filter(id=worklog.ticket_id).values_list('stage_id', 'project_id').first()
+        if row is None: return None  # задача удаляется каскадом вместе со своими rollup-строками
+        stage_id, project_id = row
+    key = {
+        'ticket_id': worklog.ticket_id, 'stage_id': stage_id, 'project_id': project_id, 'user_id': worklog.user_id,
+        'work_type_id': worklog.work_type_id, 'day': timezone.localdate(worklog.created_at),
+    }
+    return key, worklog.time_spent_minutes or 0, worklog.time_spent_seconds or 0
+
+@receiver(post_init, sender=WorkLog)
+def snapshot_worklog(sender, instance, **kwargs):
+    instance._rollup_snapshot = (instance.ticket_id, instance.user_id, instance.work_type_id, instance.created_at,
+                                 instance.time_spent_minutes, instance.time_spent_seconds)
+
+@receiver(post_save, sender=WorkLog)
+def update_rollup_on_worklog_save(sender, instance, created, **kwargs):
+    ticket_id, user_id, work_type_id, created_at, minutes, seconds = instance._rollup_snapshot
+    if not created:
+        if instance._rollup_snapshot == (instance.ticket_id, instance.user_id, instance.work_type_id, instance.created_at,
+                                         instance.time_spent_minutes, instance.time_spent_seconds):
+            return
+        old = WorkLog(ticket_id=ticket_id, user_id=user_id, work_type_id=work_type_id, created_at=created_at,
+                      time_spent_minutes=minutes, time_spent_seconds=seconds)
+        state = _worklog_rollup_state(old)
+        if state: TimeRollup.apply(state[0], -state[1], -state[2], -1)
+    state = _worklog_rollup_state(instance)
+    if state: TimeRollup.apply(state[0], state[1], state[2], 1)
+    snapshot_worklog(sender, instance)
+
+@receiver(post_delete, sender=WorkLog)
+def update_rollup_on_worklog_delete(sender, instance, **kwargs):
+    state = _worklog_rollup_state(instance)
+    if state: TimeRollup.apply(state[0], -state[1], -state[2], -1)
+
+@receiver(pre_delete, sender=WorkType)
+def merge_rollups_of_deleted_work_type(sender, instance, **kwargs):
+    # Списания уходят в work_type = NULL (SET_NULL) - их время сливается со строкой без типа (work_type_key = 0)
+    for row in TimeRollup.objects.filter(work_type=instance).values('ticket_id', 'stage_id', 'project_id', 'user_id', 'day', 'minutes', 'seconds', 'logs_count'):
+        minutes, seconds, logs_count = row.pop('minutes'), row.pop('seconds'), row.pop('logs_count')
+        TimeRollup.apply({**row, 'work_type_id': None}, minutes, seconds, logs_count)
+    TimeRollup.objects.filter(work_type=instance).delete()
+
+@receiver(pre_delete, sender=ProjectStage)
+def detach_rollups_of_deleted_stage(sender, instance, **kwargs):
+    # Задачи этапа остаются без этапа (SET_NULL), их строки - тоже; все строки задачи по-прежнему с одним stage_key
+    TimeRollup.objects.filter(stage=instance).update(stage_key=0)
+
+@receiver(post_init, sender=Ticket)
+def snapshot_ticket_placement(sender, instance, **kwargs):
+    # Через __dict__: для отложенных (.only()) полей не делаем запрос; None просто приведет к проверке при сохранении
+    instance._rollup_placement = (instance.__dict__.get('stage_id'), instance.__dict__.get('project_id'))
+
+@receiver(post_save, sender=Ticket)
+def move_rollups_with_ticket(sender, instance, created, **kwargs):
+    # Задачу перенесли в другой этап/проект - переносим и ее накопленное время; без переноса запроса нет
+    placement = (instance.stage_id, instance.project_id)
+    if not created and placement != instance._rollup_placement:
+        TimeRollup.objects.filter(ticket=instance).exclude(stage_id=instance.stage_id, project_id=instance.project_id) \
+            .update(stage_id=instance.stage_id, stage_key=instance.stage_id or 0, project_id=instance.project_id)
+    instance._rollup_placement = placement
+
+class ProgressSnapshot(models.Model):
+    # Ежедневный срез счетчиков этапа или релиза (api/progress.py, команда snapshot_progress): одна строка на объект в день.
+    # Заполнено ровно одно из stage/release; NULL в уникальных ограничениях не конфликтуют ни в SQLite, ни в MySQL
+    day = models.DateField()
+    stage = models.ForeignKey(ProjectStage, related_name='snapshots', on_delete=models.CASCADE, null=True, blank=True)
+    release = models.ForeignKey(ProjectRelease, related_name='snapshots', on_delete=models.CASCADE, null=True, blank=True)
+    open_tickets = models.PositiveIntegerField(default=0)
+    done_tickets = models.PositiveIntegerField(default=0)
+    total_tickets = models.PositiveIntegerField(default=0)
+    spent_minutes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Уникальные ограничения заодно индексы (объект, день) для чтения графиков за период
+        constraints = [
+            models.UniqueConstraint(fields=['stage', 'day'], name='snapshot_stage_day_uniq'),
+            models.UniqueConstraint(fields=['release', 'day'], name='snapshot_release_day_uniq'),
+        ]
 
 class TimeTrack(models.Model):
     ticket = models.ForeignKey(Ticket, related_name='active_tracks', on_delete=models.CASCADE)
     user = models.ForeignKey(User, related_name='active_tracks', on_delete=models.CASCADE)
     start_time = models.DateTimeField(auto_now_add=True)
     end_time = models.DateTimeField(null=True, blank=True)
-    work_type = models.ForeignKey(WorkType, on_delete=models.SET_NULL, null=True, blank=True)
\ No newline at end of file
+    work_type = models.ForeignKey(WorkType, on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        # Не больше одного открытого таймера на пользователя; это же частичный индекс для поиска открытого таймера.
+        # MySQL не поддерживает условные ограничения - там инвариант держит блокировка в api/timers.py
+        constraints = [models.UniqueConstraint(fields=['user'], condition=Q(end_time__isnull=True), name='timetrack_one_open_per_user')]
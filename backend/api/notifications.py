@@ -0,0 +1,116 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Notification, Project, Ticket
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationDispatcher:
+    # Собирает получателей за время запроса и пишет все уведомления одним bulk_create после коммита.
+    # Каждый получатель получает по одной ссылке только первое добавленное сообщение; автор действия исключается.
+
+    def __init__(self, actor=None):
+        self.actor_id = actor.id if actor is not None else None
+        self.pending = {}
+
+    def add(self, user_ids, message, link=None):
+        for user_id in user_ids:
+            if user_id and user_id != self.actor_id:
+                self.pending.setdefault((user_id, link), message)
+
+    def add_ticket_audience(self, ticket, message):
+        # Создатель, исполнитель, наблюдатели и лиды проекта - наблюдатели и лиды одним запросом
+        audience = User.objects.filter(Q(watched_tickets=ticket) | Q(led_projects=ticket.project_id)).values_list('id', flat=True).distinct()
+        self.add([ticket.creator_id, ticket.assignee_id, *audience], message, f"/tickets/{ticket.id}")
+
+    def add_tickets_audience(self, items):
+        # items - [(ticket, message)]: то же, что add_ticket_audience, но два запроса на всю пачку задач
+        ticket_ids = {ticket.id for ticket, _ in items}
+        project_ids = {ticket.project_id for ticket, _ in items}
+        watchers, leads = {}, {}
+        for ticket_id, user_id in Ticket.watchers.through.objects.filter(ticket_id__in=ticket_ids).values_list('ticket_id', 'user_id'):
+            watchers.setdefault(ticket_id, []).append(user_id)
+        for project_id, user_id in Project.leads.through.objects.filter(project_id__in=project_ids).values_list('project_id', 'user_id'):
+            leads.setdefault(project_id, []).append(user_id)
+        for ticket, message in items:
+            self.add([ticket.creator_id, ticket.assignee_id, *watchers.get(ticket.id, ()), *leads.get(ticket.project_id, ())],
+                     message, f"/tickets/{ticket.id}")
+
+    def dispatch(self):
+        if not self.pending: return
+        items = [(user_id, message, link) for (user_id, link), message in self.pending.items()]
+        self.pending = {}
+        transaction.on_commit(lambda: _submit(items))
+
+
+def write_notifications(items):
+    # Повторное событие (тот же получатель, текст и ссылка) в пределах окна дедупликации не создается
+    since = timezone.now() - timedelta(seconds=getattr(settings, 'NOTIFICATIONS_DEDUP_WINDOW', 60))
+    recent = set(Notification.objects.filter(
+        user_id__in={user_id for user_id, _, _ in items}, created_at__gte=since,
+    ).values_list('user_id', 'message', 'link'))
+    fresh = [Notification(user_id=user_id, message=message, link=link)
+             for user_id, message, link in dict.fromkeys(items) if (user_id, message, link) not in recent]
+    return Notification.objects.bulk_create(fresh)
+
+
+# Фоновая запись (NOTIFICATIONS_ASYNC) - для разовых всплесков рассылки. Очередь ограничена: когда она полна,
+# пачка пишется синхронно в потоке запроса. Поток daemon и при выходе процесса убивается без сброса, поэтому остаток
+# очереди дописывает обработчик atexit; при жестком убийстве воркера (SIGKILL) неписаные уведомления теряются.
+_queue = queue.Queue(maxsize=getattr(settings, 'NOTIFICATIONS_QUEUE_SIZE', 1000))
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _submit(items):
+    if not getattr(settings, 'NOTIFICATIONS_ASYNC', False):
+        write_notifications(items)
+        return
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            if _worker is None: atexit.register(flush)
+            _worker = threading.Thread(target=_run_worker, name='notification-dispatcher', daemon=True)
+            _worker.start()
+    try:
+        _queue.put_nowait(items)
+    except queue.Full:
+        write_notifications(items)
+
+
+def _write_safely(items):
+    try:
+        close_old_connections()
+        write_notifications(items)
+    except Exception:
+        logger.exception('Не удалось записать %d уведомлений', len(items))
+    finally:
+        connection.close()
+        _queue.task_done()
+
+
+def _run_worker():
+    while True:
+        _write_safely(_queue.get())
+
+
+def flush(timeout=5):
+    """Дописывает очередь в текущем потоке и ждет пачку, которую пишет фоновый поток (не дольше timeout секунд)."""
+    while True:
+        try: items = _queue.get_nowait()
+        except queue.Empty: break
+        _write_safely(items)
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.05)
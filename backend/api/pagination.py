@@ -0,0 +1,19 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    # Keyset-пагинация по (created_at, id): стоимость страницы не зависит от размера таблицы
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        self.max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 500)
+        return super().get_page_size(request)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Режим совместимости: пока клиент не прислал cursor/page_size, список отдается целиком, как раньше
+        wants_page = self.cursor_query_param in request.query_params or self.page_size_query_param in request.query_params
+        if getattr(settings, 'API_PAGINATION_COMPAT', True) and not wants_page:
+            return None
+        return super().paginate_queryset(queryset, request, view)
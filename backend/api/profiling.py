@@ -0,0 +1,142 @@
+import cProfile
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+# Профилирование отдельных запросов в проде. Запрос профилируется, если сотрудник прислал X-Profile: 1|pstats|collapsed
+# (или ?_profile=...), либо он попал в случайную выборку PROFILE_SAMPLE_RATE. Результат - файл в PROFILE_DIR:
+# .prof (cProfile, открывается snakeviz/pstats) или .collapsed (стек-семплер, формат flamegraph.pl/speedscope).
+# Без флага и при нулевой выборке middleware делает только проверку заголовка и параметра.
+
+FORMATS = {'pstats': 'prof', 'collapsed': 'collapsed'}
+NAME_RE = re.compile(r'^\d{8}T\d{6}-\d{6}-[\w.-]+-\d+ms\.(prof|collapsed)$')
+
+# cProfile с Python 3.12 глобален для процесса, а файлы проще читать по одному запросу - профилируем по очереди
+_busy = threading.Lock()
+
+
+class StackSampler:
+    # Раз в interval секунд снимает стек потока запроса через sys._current_frames(); функции - по первой строке,
+    # чтобы разные строки одной функции складывались в один узел
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack: self.stacks[';'.join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+def list_profiles():
+    directory = settings.PROFILE_DIR
+    if not os.path.isdir(directory): return []
+    profiles = []
+    for entry in os.scandir(directory):
+        if NAME_RE.match(entry.name):
+            stat = entry.stat()
+            profiles.append({'name': entry.name, 'size': stat.st_size, 'created_at': datetime.fromtimestamp(stat.st_mtime).astimezone()})
+    return sorted(profiles, key=lambda item: item['name'], reverse=True)
+
+
+def profile_path(name):
+    # Только имена, которые пишет сам middleware - никаких путей из запроса
+    if not NAME_RE.match(name or ''): return None
+    path = os.path.join(settings.PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def _prune():
+    for item in list_profiles()[settings.PROFILE_MAX_FILES:]:
+        try: os.remove(os.path.join(settings.PROFILE_DIR, item['name']))
+        except FileNotFoundError: pass
+
+
+def _is_staff(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated: return user.is_staff
+    # Токен DRF проверяется позже, во view - здесь тот же набор аутентификаторов, только когда флаг уже прислан
+    try:
+        user = Request(request, authenticators=[cls() for cls in api_settings.DEFAULT_AUTHENTICATION_CLASSES]).user
+    except APIException:
+        return False
+    return bool(user and user.is_staff)
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not settings.PROFILE_ENABLED: raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        requested = request.headers.get('X-Profile') or request.GET.get('_profile')
+        if requested not in ('1', *FORMATS): requested = None
+        sampled = settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+        if not (sampled or (requested and _is_staff(request))):
+            return self.get_response(request)
+        if not _busy.acquire(blocking=False):
+            response = self.get_response(request)
+            response['X-Profile'] = 'busy'
+            return response
+        try:
+            return self._profile(request, requested)
+        finally:
+            _busy.release()
+
+    def _profile(self, request, requested):
+        # Формат: из флага (X-Profile: collapsed), иначе PROFILE_FORMAT
+        fmt = requested if requested in FORMATS else settings.PROFILE_FORMAT
+        started = time.perf_counter()
+        if fmt == 'collapsed':
+            profiler = StackSampler(threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+            profiler.start()
+            try: response = self.get_response(request)
+            finally: profiler.stop()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try: response = self.get_response(request)
+            finally: profiler.disable()
+        duration_ms = int((time.perf_counter() - started) * 1000)
+
+        route = request.resolver_match.view_name if request.resolver_match else 'unresolved'
+        route = re.sub(r'[^\w.-]', '_', route)
+        name = f"{datetime.now().strftime('%Y%m%dT%H%M%S-%f')}-{route}-{duration_ms}ms.{FORMATS[fmt]}"
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        path = os.path.join(settings.PROFILE_DIR, name)
+        if fmt == 'collapsed': profiler.dump(path)
+        else: profiler.dump_stats(path)
+        _prune()
+        response['X-Profile-File'] = name
+        return response
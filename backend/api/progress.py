@@ -0,0 +1,92 @@
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import OPEN_TICKET_STATUSES, ProgressSnapshot, ProjectRelease, ProjectStage, Ticket, TimeRollup
+
+# Ежедневные срезы прогресса этапов и релизов. Команда snapshot_progress раз в день пишет по строке на каждый
+# активный этап и невыпущенный релиз; burndown и прогресс релиза читают эти строки, а не пересчитывают задачи.
+# Закрытые этапы и выпущенные релизы больше не меняются - их история просто заканчивается последним срезом.
+
+SERIES_FIELDS = ('day', 'open_tickets', 'done_tickets', 'total_tickets', 'spent_minutes')
+
+
+def take_snapshot(day=None):
+    """Срез на день (по умолчанию сегодня); повторный запуск в тот же день перезаписывает его. Возвращает (этапов, релизов)."""
+    day = day or timezone.localdate()
+    tracked = Q(status='ACTIVE') | Q(releases__status='DRAFT')
+    stage_ids = set(ProjectStage.objects.filter(tracked).values_list('id', flat=True))
+    stages_filter = ProjectStage.objects.filter(tracked).values('id')
+
+    # Два GROUP BY на все этапы сразу: счетчики задач и списанное время (по TimeRollup, до дня среза включительно)
+    counters = {stage_id: [0, 0, 0, 0] for stage_id in stage_ids}
+    tickets = Ticket.objects.filter(stage_id__in=stages_filter).values('stage_id').annotate(
+        open=Count('id', filter=Q(status__in=OPEN_TICKET_STATUSES)), done=Count('id', filter=Q(status='DONE')), total=Count('id'),
+    ).order_by()
+    # Этап, созданный между запросами, попадает в агрегаты, но не в stage_ids - он войдет в срез следующего запуска
+    for row in tickets:
+        if row['stage_id'] in counters: counters[row['stage_id']][:3] = [row['open'], row['done'], row['total']]
+    minutes = TimeRollup.objects.filter(stage_id__in=stages_filter, day__lte=day).values('stage_id').annotate(
+        minutes=Sum('minutes'),
+    ).order_by()
+    for row in minutes:
+        if row['stage_id'] in counters: counters[row['stage_id']][3] = row['minutes'] or 0
+
+    # Релиз - сумма своих этапов
+    releases = {}
+    links = ProjectRelease.stages.through.objects.filter(projectrelease__status='DRAFT').values_list('projectrelease_id', 'projectstage_id')
+    for release_id, stage_id in links:
+        total = releases.setdefault(release_id, [0, 0, 0, 0])
+        for i, value in enumerate(counters.get(stage_id, ())): total[i] += value
+    for release_id in ProjectRelease.objects.filter(status='DRAFT').values_list('id', flat=True):
+        releases.setdefault(release_id, [0, 0, 0, 0])
+
+    rows = [_snapshot(day, values, stage_id=stage_id) for stage_id, values in counters.items()]
+    rows += [_snapshot(day, values, release_id=release_id) for release_id, values in releases.items()]
+    # Перезаписываются только срезы тех, кто пишется сейчас: этап, закрытый между двумя запусками за день,
+    # сохраняет свою последнюю точку
+    with transaction.atomic():
+        ProgressSnapshot.objects.filter(day=day, stage_id__in=list(counters)).delete()
+        ProgressSnapshot.objects.filter(day=day, release_id__in=list(releases)).delete()
+        ProgressSnapshot.objects.bulk_create(rows, batch_size=1000)
+    return len(counters), len(releases)
+
+
+def _snapshot(day, values, **owner):
+    open_tickets, done_tickets, total_tickets, spent_minutes = values
+    return ProgressSnapshot(day=day, open_tickets=open_tickets, done_tickets=done_tickets, total_tickets=total_tickets,
+                            spent_minutes=spent_minutes, **owner)
+
+
+def series(snapshots, date_from=None, date_to=None):
+    if date_from: snapshots = snapshots.filter(day__gte=date_from)
+    if date_to: snapshots = snapshots.filter(day__lte=date_to)
+    return [_point(row) for row in snapshots.order_by('day').values(*SERIES_FIELDS)]
+
+
+def _point(row):
+    minutes = row.pop('spent_minutes')
+    return {**row, 'spent_hours': round(minutes / 60, 1)}
+
+
+def stage_burndown(stage, date_from=None, date_to=None):
+    points = series(stage.snapshots.all(), date_from, date_to)
+    # Идеальная линия: от открытых задач в первом срезе до нуля к дедлайну этапа
+    ideal = None
+    if points and stage.deadline:
+        ideal = [{'day': points[0]['day'], 'open_tickets': points[0]['open_tickets']}, {'day': stage.deadline, 'open_tickets': 0}]
+    return {'stage': stage.id, 'name': stage.name, 'deadline': stage.deadline, 'points': points, 'ideal': ideal}
+
+
+def release_progress(release, date_from=None, date_to=None):
+    points = series(release.snapshots.all(), date_from, date_to)
+    # Разбивка по этапам - из срезов этих этапов за последний день ряда релиза
+    stages = []
+    if points:
+        rows = ProgressSnapshot.objects.filter(stage__releases=release, day=points[-1]['day']) \
+            .order_by('stage_id').values('stage_id', 'stage__name', *SERIES_FIELDS)
+        stages = [{'stage': row.pop('stage_id'), 'name': row.pop('stage__name'), **_point(row)} for row in rows]
+    return {
+        'release': release.id, 'name': release.name, 'version': release.version, 'status': release.status,
+        'release_date': release.release_date, 'points': points, 'stages': stages,
+    }
@@ -0,0 +1,151 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Ticket, TicketComment, TicketNote
+
+# Полнотекстовый поиск по задачам: название, описание, комментарии и заметки.
+# SQLite - виртуальная таблица FTS5 (rowid = id задачи), синхронизируется сигналами ниже.
+# MySQL - FULLTEXT-индексы на исходных таблицах, их поддерживает сам InnoDB.
+# Первичное построение / пересборка: `python manage.py rebuild_search_index`.
+
+FTS_TABLE = 'api_ticket_fts'
+MYSQL_FULLTEXT_INDEXES = [
+    ('api_ticket', 'ticket_fulltext_idx', 'title, description'),
+    ('api_ticketcomment', 'comment_fulltext_idx', 'text'),
+    ('api_ticketnote', 'note_fulltext_idx', 'text'),
+]
+_fts_ready = False
+
+
+def _terms(query):
+    return re.findall(r'\w+', query)[:16]
+
+
+def _sqlite():
+    return connection.vendor == 'sqlite'
+
+
+def _ensure_fts():
+    global _fts_ready
+    if not _fts_ready:
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                           "title, description, comments, notes, tokenize='unicode61 remove_diacritics 2')")
+        _fts_ready = True
+
+
+def _joined_texts(model, ticket_id):
+    return '\n'.join(model.objects.filter(ticket_id=ticket_id).order_by('id').values_list('text', flat=True))
+
+
+def index_ticket(ticket_id, title=None, description=None):
+    if not _sqlite(): return
+    _ensure_fts()
+    with connection.cursor() as cursor:
+        if title is not None:
+            cursor.execute(f"UPDATE {FTS_TABLE} SET title = %s, description = %s WHERE rowid = %s", [title, description, ticket_id])
+            if cursor.rowcount: return
+        row = Ticket.objects.filter(id=ticket_id).values_list('title', 'description').first()
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [ticket_id])
+        if row:
+            cursor.execute(f"INSERT INTO {FTS_TABLE} (rowid, title, description, comments, notes) VALUES (%s, %s, %s, %s, %s)",
+                           [ticket_id, *row, _joined_texts(TicketComment, ticket_id), _joined_texts(TicketNote, ticket_id)])
+
+
+def index_ticket_texts(ticket_id, column, model):
+    if not _sqlite(): return
+    _ensure_fts()
+    with connection.cursor() as cursor:
+        cursor.execute(f"UPDATE {FTS_TABLE} SET {column} = %s WHERE rowid = %s", [_joined_texts(model, ticket_id), ticket_id])
+        if not cursor.rowcount: index_ticket(ticket_id)
+
+
+def unindex_ticket(ticket_id):
+    if not _sqlite(): return
+    _ensure_fts()
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [ticket_id])
+
+
+def rebuild_index(batch_size=1000):
+    if connection.vendor == 'mysql':
+        with connection.cursor() as cursor:
+            for table, name, columns in MYSQL_FULLTEXT_INDEXES:
+                cursor.execute("SELECT COUNT(*) FROM information_schema.statistics WHERE table_schema = DATABASE() "
+                               "AND table_name = %s AND index_name = %s", [table, name])
+                if not cursor.fetchone()[0]:
+                    cursor.execute(f"ALTER TABLE {table} ADD FULLTEXT INDEX {name} ({columns})")
+        return Ticket.objects.count()
+    if not _sqlite(): return 0
+    global _fts_ready
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        _fts_ready = False
+        _ensure_fts()
+        comments, notes = {}, {}
+        for ticket_id, text in TicketComment.objects.order_by('id').values_list('ticket_id', 'text').iterator(chunk_size=batch_size):
+            comments.setdefault(ticket_id, []).append(text)
+        for ticket_id, text in TicketNote.objects.order_by('id').values_list('ticket_id', 'text').iterator(chunk_size=batch_size):
+            notes.setdefault(ticket_id, []).append(text)
+        rows = [(ticket_id, title, description, '\n'.join(comments.get(ticket_id, [])), '\n'.join(notes.get(ticket_id, [])))
+                for ticket_id, title, description in Ticket.objects.values_list('id', 'title', 'description').iterator(chunk_size=batch_size)]
+        cursor.executemany(f"INSERT INTO {FTS_TABLE} (rowid, title, description, comments, notes) VALUES (%s, %s, %s, %s, %s)", rows)
+    return len(rows)
+
+
+def search_ticket_ids(query, limit, offset):
+    """Возвращает (общее число совпадений, id задач страницы в порядке релевантности)."""
+    terms = _terms(query)
+    if not terms: return 0, []
+    if _sqlite():
+        _ensure_fts()
+        match = ' '.join(f'"{term}"*' for term in terms)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+            total = cursor.fetchone()[0]
+            # bm25: совпадение в названии весит больше, чем в описании, комментариях и заметках
+            cursor.execute(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                           f"ORDER BY bm25({FTS_TABLE}, 10.0, 3.0, 1.0, 1.0) LIMIT %s OFFSET %s", [match, limit, offset])
+            return total, [row[0] for row in cursor.fetchall()]
+    if connection.vendor == 'mysql':
+        match = ' '.join(f'+{term}*' for term in terms)
+        hits = ("SELECT id AS ticket_id, MATCH(title, description) AGAINST (%s IN BOOLEAN MODE) * 3 AS score FROM api_ticket "
+                "WHERE MATCH(title, description) AGAINST (%s IN BOOLEAN MODE) "
+                "UNION ALL SELECT ticket_id, MATCH(text) AGAINST (%s IN BOOLEAN MODE) FROM api_ticketcomment WHERE MATCH(text) AGAINST (%s IN BOOLEAN MODE) "
+                "UNION ALL SELECT ticket_id, MATCH(text) AGAINST (%s IN BOOLEAN MODE) FROM api_ticketnote WHERE MATCH(text) AGAINST (%s IN BOOLEAN MODE)")
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(DISTINCT ticket_id) FROM ({hits}) hits", [match] * 6)
+            total = cursor.fetchone()[0]
+            cursor.execute(f"SELECT ticket_id FROM ({hits}) hits GROUP BY ticket_id ORDER BY SUM(score) DESC LIMIT %s OFFSET %s", [match] * 6 + [limit, offset])
+            return total, [row[0] for row in cursor.fetchall()]
+    # Прочие СУБД: без индекса, только чтобы эндпоинт работал
+    qs = Ticket.objects.all()
+    for term in terms: qs = qs.filter(Q(title__icontains=term) | Q(description__icontains=term))
+    return qs.count(), list(qs.order_by('-updated_at').values_list('id', flat=True)[offset:offset + limit])
+
+
+@receiver(post_save, sender=Ticket)
+def index_ticket_on_save(sender, instance, created, **kwargs):
+    if created: index_ticket(instance.id)
+    else: index_ticket(instance.id, instance.title, instance.description)
+
+
+@receiver(post_delete, sender=Ticket)
+def unindex_ticket_on_delete(sender, instance, **kwargs):
+    unindex_ticket(instance.id)
+
+
+@receiver(post_save, sender=TicketComment)
+@receiver(post_delete, sender=TicketComment)
+def index_ticket_comments(sender, instance, **kwargs):
+    index_ticket_texts(instance.ticket_id, 'comments', TicketComment)
+
+
+@receiver(post_save, sender=TicketNote)
+@receiver(post_delete, sender=TicketNote)
+def index_ticket_notes(sender, instance, **kwargs):
+    index_ticket_texts(instance.ticket_id, 'notes', TicketNote)
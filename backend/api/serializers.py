@@ -1,8 +1,31 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from django.contrib.auth.models import User
 from django.db.models import Sum
 from django.utils import timezone
-from .models import (Department, Profile, ProfileDepartment, Project, ProjectStage, ProjectRelease, Tag, Ticket, TicketComment, WorkType, WorkLog, TimeTrack, TicketNote, TicketHistory, TicketAttachment, Notification, CompanyEvent, EventLabel, Skill, ProfileSkill)
+from . import attachments, avatars
+from .timers import active_timer_payload
+from .models import (OPEN_TICKET_STATUSES, Department, Profile, ProfileDepartment, Project, ProjectStage, ProjectRelease, Tag, Ticket, TicketComment, WorkType, WorkLog, TimeTrack, TicketNote, TicketHistory, TicketAttachment, Notification, CompanyEvent, EventLabel, Skill, ProfileSkill)
+
+def split_query_param(value):
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+class FieldSelectionMixin:
+    # ?fields=a,b оставляет только перечисленные поля, ?expand=x,y подключает тяжелые поля из Meta.expandable_fields.
+    # context['field_selection'] = False отключает выборку (данные, которые кешируются для всех вариантов запроса)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or not self.context.get('field_selection', True): return
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        for name in split_query_param(request.query_params.get('expand')):
+            if name in expandable:
+                field_class, field_kwargs = expandable[name]
+                self.fields[name] = field_class(**field_kwargs)
+        # На запись поля не отбрасываются: иначе PATCH ?fields=id молча проигнорировал бы присланные значения
+        only = split_query_param(request.query_params.get('fields')) if request.method in SAFE_METHODS else []
+        if only:
+            for name in set(self.fields) - set(only): self.fields.pop(name)
 
 class DepartmentSerializer(serializers.ModelSerializer):
     class Meta: model = Department; fields = '__all__'
@@ -29,15 +52,19 @@ class ProjectStageSerializer(serializers.ModelSerializer):
     
     class Meta: model = ProjectStage; fields = '__all__'
         
+    # Счетчики берутся из аннотаций ProjectStage.objects.with_stats(), иначе считаются запросом
     def get_open_tickets_count(self, obj):
-        return obj.tickets.filter(status__in=['OPEN', 'IN_PROGRESS', 'REVIEW']).count()
+        if hasattr(obj, 'open_tickets_count'): return obj.open_tickets_count
+        return obj.tickets.filter(status__in=OPEN_TICKET_STATUSES).count()
     def get_total_tickets_count(self, obj):
+        if hasattr(obj, 'total_tickets_count'): return obj.total_tickets_count
         return obj.tickets.count()
     def get_done_tickets_count(self, obj):
+        if hasattr(obj, 'done_tickets_count'): return obj.done_tickets_count
         return obj.tickets.filter(status='DONE').count()
     def get_spent_hours(self, obj):
-        logs = WorkLog.objects.filter(ticket__stage=obj)
-        total_mins = logs.aggregate(Sum('time_spent_minutes'))['time_spent_minutes__sum'] or 0
+        if hasattr(obj, 'spent_minutes'): return round(obj.spent_minutes / 60, 1)
+        total_mins = obj.time_rollups.aggregate(Sum('minutes'))['minutes__sum'] or 0
         return round(total_mins / 60, 1)
 
 class ProjectReleaseSerializer(serializers.ModelSerializer):
@@ -55,32 +82,39 @@ class ProjectSerializer(serializers.ModelSerializer):
     
     class Meta: model = Project; fields = '__all__'
         
+    # Счетчики берутся из аннотаций Project.objects.with_stats(), иначе считаются запросом
     def get_open_tickets_count(self, obj):
-        return obj.tickets.filter(status__in=['OPEN', 'IN_PROGRESS', 'REVIEW']).count()
+        if hasattr(obj, 'open_tickets_count'): return obj.open_tickets_count
+        return obj.tickets.filter(status__in=OPEN_TICKET_STATUSES).count()
     def get_spent_hours_month(self, obj):
-        today = timezone.now().date()
-        month_start = today.replace(day=1)
-        logs = WorkLog.objects.filter(ticket__project=obj, created_at__date__gte=month_start)
-        total_mins = logs.aggregate(Sum('time_spent_minutes'))['time_spent_minutes__sum'] or 0
+        if hasattr(obj, 'spent_minutes_month'): return round(obj.spent_minutes_month / 60, 1)
+        month_start = timezone.localdate().replace(day=1)
+        total_mins = obj.time_rollups.filter(day__gte=month_start).aggregate(Sum('minutes'))['minutes__sum'] or 0
         return round(total_mins / 60, 1)
     def get_total_spent_hours(self, obj):
-        logs = WorkLog.objects.filter(ticket__project=obj)
-        total_mins = logs.aggregate(Sum('time_spent_minutes'))['time_spent_minutes__sum'] or 0
+        if hasattr(obj, 'total_spent_minutes'): return round(obj.total_spent_minutes / 60, 1)
+        total_mins = obj.time_rollups.aggregate(Sum('minutes'))['minutes__sum'] or 0
         return round(total_mins / 60, 1)
     def get_active_stages_count(self, obj):
+        if hasattr(obj, 'active_stages_count'): return obj.active_stages_count
         return obj.stages.filter(status='ACTIVE').count()
     def get_total_stages_count(self, obj):
+        if hasattr(obj, 'total_stages_count'): return obj.total_stages_count
         return obj.stages.count()
     def get_total_tickets_count(self, obj):
+        if hasattr(obj, 'total_tickets_count'): return obj.total_tickets_count
         return obj.tickets.count()
 
 class ProfileSerializer(serializers.ModelSerializer):
     departments_details = ProfileDepartmentSerializer(source='department_links', many=True, read_only=True)
     skills = ProfileSkillSerializer(many=True, read_only=True)
     involved_projects_details = ProjectSerializer(source='involved_projects', many=True, read_only=True)
+    avatar_variants = serializers.SerializerMethodField()
     class Meta: 
         model = Profile 
-        fields = ['avatar', 'bio', 'departments', 'departments_details', 'role', 'skills', 'involved_projects', 'involved_projects_details', 'tg_link', 'tg_channel_link', 'gitlab_link', 'github_link', 'phone_number']
+        fields = ['avatar', 'avatar_variants', 'bio', 'departments', 'departments_details', 'role', 'skills', 'involved_projects', 'involved_projects_details', 'tg_link', 'tg_channel_link', 'gitlab_link', 'github_link', 'phone_number']
+    def get_avatar_variants(self, obj):
+        return avatars.variant_urls(self.context.get('request'), obj)
 
 class UserSerializer(serializers.ModelSerializer):
     profile = ProfileSerializer(read_only=True)
@@ -90,6 +124,7 @@ class UserSerializer(serializers.ModelSerializer):
         model = User 
         fields = ['id', 'username', 'first_name', 'last_name', 'email', 'profile', 'led_projects', 'active_tickets_count']
     def get_active_tickets_count(self, obj):
+        if hasattr(obj, 'active_tickets_count'): return obj.active_tickets_count
         return obj.assigned_tickets.exclude(status='DONE').count()
 
 class TagSerializer(serializers.ModelSerializer):
@@ -109,7 +144,15 @@ class TicketHistorySerializer(serializers.ModelSerializer):
 
 class TicketAttachmentSerializer(serializers.ModelSerializer):
     user_details = UserSerializer(source='user', read_only=True)
-    class Meta: model = TicketAttachment; fields = '__all__'; read_only_fields = ['user']
+    download_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
+    class Meta: model = TicketAttachment; fields = '__all__'; read_only_fields = ['user', 'sha256', 'size']
+
+    def get_download_url(self, obj):
+        return attachments.signed_url(self.context.get('request'), obj, 'download')
+
+    def get_thumbnail_url(self, obj):
+        return attachments.signed_url(self.context.get('request'), obj, 'thumbnail') if attachments.is_image(obj.filename) else None
 
 class NotificationSerializer(serializers.ModelSerializer):
     class Meta: model = Notification; fields = '__all__'
@@ -131,7 +174,7 @@ class WorkLogSerializer(serializers.ModelSerializer):
     work_type_details = WorkTypeSerializer(source='work_type', read_only=True)
     class Meta: model = WorkLog; fields = '__all__'
 
-class TicketSerializer(serializers.ModelSerializer):
+class TicketSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     assignee_details = UserSerializer(source='assignee', read_only=True)
     creator_details = UserSerializer(source='creator', read_only=True)
     project_details = ProjectSerializer(source='project', read_only=True)
@@ -149,14 +192,110 @@ class TicketSerializer(serializers.ModelSerializer):
     class Meta: model = Ticket; fields = '__all__'; read_only_fields = ['creator']
 
     def get_active_timer(self, obj):
+        # Только для детальной карточки; списки берут таймер из /api/timers/active/
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            active_track = obj.active_tracks.filter(user=request.user, end_time__isnull=True).first()
-            if active_track: return {'id': active_track.id, 'start_time': active_track.start_time, 'work_type': active_track.work_type_id}
+            return active_timer_payload(obj.active_tracks.filter(user=request.user, end_time__isnull=True).first())
         return None
 
     def get_total_time_spent(self, obj):
-        return obj.worklogs.aggregate(Sum('time_spent_minutes'))['time_spent_minutes__sum'] or 0
+        return obj.time_rollups.aggregate(Sum('minutes'))['minutes__sum'] or 0
+
+class UserBriefSerializer(serializers.ModelSerializer):
+    avatar = serializers.ImageField(source='profile.avatar', read_only=True)
+    avatar_variants = serializers.SerializerMethodField()
+    class Meta: model = User; fields = ['id', 'username', 'first_name', 'last_name', 'avatar', 'avatar_variants']
+    def get_avatar_variants(self, obj):
+        return avatars.variant_urls(self.context.get('request'), obj.profile)
+
+class ProjectBriefSerializer(serializers.ModelSerializer):
+    class Meta: model = Project; fields = ['id', 'name', 'status']
+
+class ProjectStageBriefSerializer(serializers.ModelSerializer):
+    class Meta: model = ProjectStage; fields = ['id', 'name', 'status']
+
+class UserDirectorySerializer(FieldSelectionMixin, serializers.ModelSerializer):
+    # Список сотрудников (команда, выпадающие списки): плоские поля профиля, счетчики из аннотаций with_user_workload()
+    avatar = serializers.ImageField(source='profile.avatar', read_only=True)
+    avatar_variants = serializers.SerializerMethodField()
+    role = serializers.CharField(source='profile.role', read_only=True)
+    tg_link = serializers.CharField(source='profile.tg_link', read_only=True)
+    departments = ProfileDepartmentSerializer(source='profile.department_links', many=True, read_only=True)
+    skills = ProfileSkillSerializer(source='profile.skills', many=True, read_only=True)
+    active_tickets_count = serializers.IntegerField(read_only=True)
+    week_hours = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'first_name', 'last_name', 'email', 'avatar', 'avatar_variants', 'role', 'tg_link',
+                  'departments', 'skills', 'active_tickets_count', 'week_hours']
+        expandable_fields = {
+            'projects': (ProjectBriefSerializer, {'source': 'profile.involved_projects', 'many': True, 'read_only': True}),
+            'led_projects': (ProjectBriefSerializer, {'many': True, 'read_only': True}),
+        }
+        expandable_prefetch = {
+            'projects': ['profile__involved_projects'],
+            'led_projects': ['led_projects'],
+        }
+
+    def get_avatar_variants(self, obj):
+        return avatars.variant_urls(self.context.get('request'), obj.profile)
+    def get_week_hours(self, obj):
+        return round(obj.week_minutes / 60, 1)
+
+class WorkLogBriefSerializer(serializers.ModelSerializer):
+    user_details = UserBriefSerializer(source='user', read_only=True)
+    work_type_details = WorkTypeSerializer(source='work_type', read_only=True)
+    class Meta: model = WorkLog; fields = '__all__'
+
+# Варианты для ?expand= списка задач: автор - UserBriefSerializer, без профиля с проектами на каждую строку
+class TicketCommentBriefSerializer(TicketCommentSerializer):
+    author_details = UserBriefSerializer(source='author', read_only=True)
+
+class TicketNoteBriefSerializer(TicketNoteSerializer):
+    author_details = UserBriefSerializer(source='author', read_only=True)
+
+class TicketAttachmentBriefSerializer(TicketAttachmentSerializer):
+    user_details = UserBriefSerializer(source='user', read_only=True)
+
+class TicketListSerializer(FieldSelectionMixin, serializers.ModelSerializer):
+    assignee_details = UserBriefSerializer(source='assignee', read_only=True)
+    project_details = ProjectBriefSerializer(source='project', read_only=True)
+    stage_details = ProjectStageBriefSerializer(source='stage', read_only=True)
+    tags_details = TagSerializer(source='tags', many=True, read_only=True)
+
+    class Meta:
+        model = Ticket
+        fields = ['id', 'title', 'status', 'priority', 'project', 'project_details', 'stage', 'stage_details',
+                  'creator', 'assignee', 'assignee_details', 'tags', 'tags_details', 'due_date', 'created_at', 'updated_at']
+        read_only_fields = ['creator']
+        expandable_fields = {
+            'description': (serializers.CharField, {'read_only': True}),
+            'creator_details': (UserBriefSerializer, {'source': 'creator', 'read_only': True}),
+            'comments_details': (TicketCommentBriefSerializer, {'source': 'comments', 'many': True, 'read_only': True}),
+            'notes_details': (TicketNoteBriefSerializer, {'source': 'notes', 'many': True, 'read_only': True}),
+            'worklogs_details': (WorkLogBriefSerializer, {'source': 'worklogs', 'many': True, 'read_only': True}),
+            'attachments_details': (TicketAttachmentBriefSerializer, {'source': 'attachments', 'many': True, 'read_only': True}),
+        }
+        expandable_prefetch = {
+            'creator_details': ['creator__profile'],
+            'comments_details': ['comments__author__profile'],
+            'notes_details': ['notes__author__profile'],
+            'worklogs_details': ['worklogs__user__profile', 'worklogs__work_type__parent'],
+            'attachments_details': ['attachments__user__profile'],
+        }
 
 class TimeTrackSerializer(serializers.ModelSerializer):
-    class Meta: model = TimeTrack; fields = '__all__'
\ No newline at end of file
+    class Meta: model = TimeTrack; fields = '__all__'
+
+class TicketBulkOperationSerializer(serializers.Serializer):
+    # Одна операция POST /api/tickets/bulk/; ссылки на пользователей/этапы/теги проверяются пачкой в api/bulk.py
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=Ticket._meta.get_field('status').choices, required=False)
+    priority = serializers.ChoiceField(choices=Ticket._meta.get_field('priority').choices, required=False)
+    assignee = serializers.IntegerField(allow_null=True, required=False)
+    stage = serializers.IntegerField(allow_null=True, required=False)
+    due_date = serializers.DateTimeField(allow_null=True, required=False)
+    tags = serializers.ListField(child=serializers.IntegerField(), required=False)
+    add_tags = serializers.ListField(child=serializers.IntegerField(), required=False)
+    remove_tags = serializers.ListField(child=serializers.IntegerField(), required=False)
@@ -0,0 +1,65 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .models import TimeTrack, WorkLog
+
+# Таймеры учета времени. Все операции пользователя сериализуются блокировкой его строки (SELECT ... FOR UPDATE),
+# а условный UniqueConstraint на TimeTrack не дает появиться второму открытому таймеру даже в обход сервиса.
+# Закрытый таймер превращается в WorkLog в той же транзакции.
+
+
+class TimerError(Exception):
+    pass
+
+
+def active_timer_payload(track):
+    if track is None: return None
+    return {'id': track.id, 'ticket': track.ticket_id, 'start_time': track.start_time, 'work_type': track.work_type_id}
+
+
+def get_active_track(user):
+    return TimeTrack.objects.filter(user=user, end_time__isnull=True).select_related('ticket').first()
+
+
+def _lock_user(user):
+    User.objects.select_for_update().filter(pk=user.pk).values_list('pk', flat=True).first()
+
+
+def _close(track, end_time):
+    track.end_time = end_time
+    track.save(update_fields=['end_time'])
+    duration_sec = (track.end_time - track.start_time).total_seconds()
+    minutes = int(duration_sec // 60)
+    seconds = int(duration_sec % 60)
+    if minutes == 0 and seconds == 0: seconds = 1
+    return WorkLog.objects.create(
+        ticket=track.ticket,
+        user_id=track.user_id,
+        work_type_id=track.work_type_id,
+        time_spent_minutes=minutes,
+        time_spent_seconds=seconds,
+        comment="Автоматический трекинг"
+    )
+
+
+def start_timer(user, ticket, work_type=None):
+    """Запускает таймер по задаче; уже открытый таймер пользователя закрывается в WorkLog."""
+    with transaction.atomic():
+        _lock_user(user)
+        now = timezone.now()
+        for track in TimeTrack.objects.select_for_update().select_related('ticket').filter(user=user, end_time__isnull=True):
+            _close(track, now)
+        return TimeTrack.objects.create(ticket=ticket, user=user, work_type=work_type)
+
+
+def stop_timer(user, ticket=None):
+    """Останавливает открытый таймер пользователя (по задаче, если указана) и возвращает созданный WorkLog."""
+    with transaction.atomic():
+        _lock_user(user)
+        tracks = TimeTrack.objects.select_for_update().select_related('ticket').filter(user=user, end_time__isnull=True)
+        if ticket is not None: tracks = tracks.filter(ticket=ticket)
+        track = tracks.first()
+        if track is None:
+            raise TimerError('No active timer.')
+        return _close(track, timezone.now())
@@ -0,0 +1,226 @@
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from . import dashboard, filters
+from .models import Ticket, TimeRollup, WorkLog, WorkType
+
+# Выгрузка и загрузка трудозатрат для бухгалтерии. Выгрузка идет построчно из .values().iterator()
+# (CSV или XLSX, собираемый потоком в zip без сторонних библиотек), загрузка - CSV пачками по bulk_create.
+# Память не зависит от размера периода: в ней живет только текущая пачка строк.
+
+EXPORT_COLUMNS = [
+    ('id', 'id'), ('date', 'created_at'), ('user_id', 'user_id'), ('user', 'user__username'),
+    ('project_id', 'ticket__project_id'), ('project', 'ticket__project__name'), ('ticket_id', 'ticket_id'),
+    ('ticket', 'ticket__title'), ('work_type_id', 'work_type_id'), ('work_type', 'work_type__name'),
+    ('minutes', 'time_spent_minutes'), ('seconds', 'time_spent_seconds'), ('comment', 'comment'),
+]
+IMPORT_COLUMNS = ['date', 'ticket_id', 'user_id', 'work_type_id', 'minutes', 'seconds', 'comment']
+
+
+def export_rows(queryset):
+    fields = [field for _, field in EXPORT_COLUMNS]
+    for values in queryset.values_list(*fields).iterator(chunk_size=2000):
+        row = list(values)
+        row[1] = timezone.localtime(row[1]).replace(tzinfo=None)
+        yield row
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def csv_stream(queryset):
+    writer = csv.writer(_Echo())
+    # BOM - чтобы Excel открыл кириллицу без мастера импорта
+    yield '\ufeff' + writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for row in export_rows(queryset):
+        row[1] = row[1].strftime('%Y-%m-%d %H:%M:%S')
+        yield writer.writerow(row)
+
+
+class _Sink:
+    # Файл без seek для zipfile: все записанное отдается наружу порциями через drain()
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+_XLSX_PARTS = {
+    '[Content_Types].xml': '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>',
+    '_rels/.rels': '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>',
+    'xl/workbook.xml': '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Worklogs" sheetId="1" r:id="rId1"/></sheets></workbook>',
+    'xl/_rels/workbook.xml.rels': '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+        '</Relationships>',
+    # Стиль 1 - встроенный формат даты-времени (numFmtId 22)
+    'xl/styles.xml': '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="22" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>',
+}
+_XLSX_EPOCH = datetime(1899, 12, 30)
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _xlsx_cell(value):
+    if value is None: return '<c/>'
+    if isinstance(value, datetime):
+        return f'<c s="1"><v>{(value - _XLSX_EPOCH).total_seconds() / 86400:.6f}</v></c>'
+    if isinstance(value, (int, float)): return f'<c><v>{value}</v></c>'
+    text = escape(_XML_ILLEGAL.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def xlsx_stream(queryset, flush_every=500):
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, content)
+        yield sink.drain()
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                         '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>').encode())
+            sheet.write(('<row>' + ''.join(_xlsx_cell(name) for name, _ in EXPORT_COLUMNS) + '</row>').encode())
+            for index, row in enumerate(export_rows(queryset), 1):
+                sheet.write(('<row>' + ''.join(_xlsx_cell(value) for value in row) + '</row>').encode())
+                if index % flush_every == 0: yield sink.drain()
+            sheet.write(b'</sheetData></worksheet>')
+        yield sink.drain()
+    yield sink.drain()
+
+
+class ImportFailed(Exception):
+    def __init__(self, errors):
+        super().__init__('Import failed.')
+        self.errors = errors
+
+
+def import_csv(user, file):
+    """Загружает трудозатраты из CSV (колонки IMPORT_COLUMNS, остальные игнорируются) одной транзакцией."""
+    reader = csv.DictReader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+    missing = {'ticket_id', 'minutes'} - set(reader.fieldnames or ())
+    if missing: raise ImportFailed([{'row': 1, 'errors': {name: ['Missing column.'] for name in sorted(missing)}}])
+
+    batch_size = getattr(settings, 'WORKLOG_IMPORT_BATCH_SIZE', 1000)
+    errors, rollups, created = [], {}, 0
+    with transaction.atomic():
+        batch = []
+        # Строка 1 - заголовок, данные начинаются со второй
+        for line, row in enumerate(reader, 2):
+            batch.append((line, row))
+            if len(batch) >= batch_size:
+                created += _import_batch(user, batch, errors, rollups)
+                batch = []
+        if batch: created += _import_batch(user, batch, errors, rollups)
+        if errors: raise ImportFailed(sorted(errors, key=lambda error: error['row']))
+        # bulk_create не шлет post_save - TimeRollup обновляем агрегатами, по одному apply на ключ
+        for key, (minutes, seconds, count) in rollups.items():
+            TimeRollup.apply(dict(key), minutes, seconds, count)
+        dashboard.invalidate(global_stats=True, user_ids=[user_id for key in rollups for name, user_id in key if name == 'user_id'])
+    return created
+
+
+def _import_batch(user, batch, errors, rollups):
+    max_errors = getattr(settings, 'WORKLOG_IMPORT_MAX_ERRORS', 50)
+    parsed = []
+    for line, row in batch:
+        values, row_errors = _parse_row(user, row)
+        if row_errors: errors.append({'row': line, 'errors': row_errors})
+        else: parsed.append((line, values))
+    tickets = dict((ticket_id, (stage_id, project_id)) for ticket_id, stage_id, project_id in
+                   Ticket.objects.filter(id__in={v['ticket_id'] for _, v in parsed}).values_list('id', 'stage_id', 'project_id'))
+    work_types = set(WorkType.objects.filter(id__in={v['work_type_id'] for _, v in parsed if v['work_type_id']}).values_list('id', flat=True))
+    users = set(User.objects.filter(id__in={v['user_id'] for _, v in parsed}).values_list('id', flat=True))
+
+    logs = []
+    for line, values in parsed:
+        row_errors = {}
+        if values['ticket_id'] not in tickets: row_errors['ticket_id'] = ['Unknown ticket.']
+        if values['work_type_id'] and values['work_type_id'] not in work_types: row_errors['work_type_id'] = ['Unknown work type.']
+        if values['user_id'] not in users: row_errors['user_id'] = ['Unknown user.']
+        if row_errors: errors.append({'row': line, 'errors': row_errors})
+        else: logs.append(WorkLog(**values))
+    del errors[max_errors:]
+    # После первой ошибки строки только проверяются: транзакция все равно будет откатана
+    if errors or not logs: return 0
+
+    WorkLog.objects.bulk_create(logs)
+    for log in logs:
+        stage_id, project_id = tickets[log.ticket_id]
+        key = (('ticket_id', log.ticket_id), ('stage_id', stage_id), ('project_id', project_id), ('user_id', log.user_id),
+               ('work_type_id', log.work_type_id), ('day', timezone.localdate(log.created_at)))
+        total = rollups.setdefault(key, [0, 0, 0])
+        total[0] += log.time_spent_minutes
+        total[1] += log.time_spent_seconds
+        total[2] += 1
+    return len(logs)
+
+
+def _parse_row(user, row):
+    values, errors = {'comment': (row.get('comment') or '').strip()}, {}
+    for column, required in (('ticket_id', True), ('user_id', False), ('work_type_id', False), ('minutes', True), ('seconds', False)):
+        raw = (row.get(column) or '').strip()
+        if not raw:
+            if required: errors[column] = ['This field is required.']
+            values[column] = 0 if column == 'seconds' else None
+        elif not raw.isdigit():
+            errors[column] = ['Expected a non-negative integer.']
+        else:
+            values[column] = int(raw)
+    if errors: return None, errors
+    if values['user_id'] is None: values['user_id'] = user.id
+    elif values['user_id'] != user.id and not user.is_staff:
+        return None, {'user_id': ['Only staff can log time for other users.']}
+    if values['minutes'] == 0 and values['seconds'] == 0:
+        return None, {'minutes': ['Time spent must be positive.']}
+    # Дата как в выгрузке (YYYY-MM-DD HH:MM:SS, местное время) или просто день; без нее - момент загрузки
+    raw_date = (row.get('date') or '').strip()
+    created_at = timezone.now()
+    if raw_date:
+        try: created_at = filters.moment(raw_date)
+        except ValueError: return None, {'date': ['Expected YYYY-MM-DD or YYYY-MM-DD HH:MM:SS.']}
+        if created_at > timezone.now(): return None, {'date': ['Date cannot be in the future.']}
+    return {'ticket_id': values['ticket_id'], 'user_id': values['user_id'], 'work_type_id': values['work_type_id'],
+            'time_spent_minutes': values['minutes'], 'time_spent_seconds': values['seconds'], 'comment': values['comment'],
+            'created_at': created_at}, {}
@@ -4,7 +4,8 @@ from .views import (
     ProjectViewSet, ProjectReleaseViewSet, ProjectStageViewSet, TicketViewSet, 
     WorkLogViewSet, DashboardView, UserViewSet, ProfileViewSet, TagViewSet, 
     WorkTypeViewSet, TicketCommentViewSet, TicketNoteViewSet, TicketAttachmentViewSet, 
-    NotificationViewSet, CompanyEventViewSet, EventLabelViewSet, SkillViewSet
+    NotificationViewSet, CompanyEventViewSet, EventLabelViewSet, SkillViewSet, ReportsView, TimerViewSet,
+    AttachmentUploadViewSet, AvatarViewSet, MetricsView, ProfileDumpViewSet
 )
 
 router = DefaultRouter()
@@ -15,6 +16,7 @@ router.register(r'tickets', TicketViewSet)
 router.register(r'comments', TicketCommentViewSet)
 router.register(r'notes', TicketNoteViewSet)
 router.register(r'attachments', TicketAttachmentViewSet)
+router.register(r'attachment-uploads', AttachmentUploadViewSet, basename='attachment-uploads')
 router.register(r'notifications', NotificationViewSet, basename='notifications')
 router.register(r'event-labels', EventLabelViewSet)
 router.register(r'events', CompanyEventViewSet, basename='events')
@@ -25,9 +27,15 @@ router.register(r'profiles', ProfileViewSet)
 router.register(r'tags', TagViewSet)
 router.register(r'worktypes', WorkTypeViewSet)
 router.register(r'dashboard', DashboardView, basename='dashboard')
+router.register(r'reports', ReportsView, basename='reports')
+router.register(r'timers', TimerViewSet, basename='timers')
 
 urlpatterns = [
     # Железобетонно фиксируем кастомный путь, чтобы избежать 404
     path('users/me/', UserViewSet.as_view({'get': 'me', 'patch': 'me'}), name='user-me'),
+    path('avatars/<str:pk>', AvatarViewSet.as_view({'get': 'retrieve'}), name='avatar-variant'),
+    path('_metrics/', MetricsView.as_view({'get': 'list'}), name='metrics'),
+    path('_profiles/', ProfileDumpViewSet.as_view({'get': 'list'}), name='profile-dump-list'),
+    path('_profiles/<str:pk>', ProfileDumpViewSet.as_view({'get': 'retrieve'}), name='profile-dump-detail'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
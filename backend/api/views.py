@@ -1,26 +1,61 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Sum, Count, Q
+from rest_framework.settings import api_settings
+from rest_framework.exceptions import ValidationError
+from django.db.models import Sum, Count, Max, Q, F, Prefetch
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
+from django.utils.dateparse import parse_date
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 import json
+import os
+import time
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core import signing
 from django.contrib.auth.models import User
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
 from .models import (Project, ProjectStage, ProjectRelease, Tag, Ticket, TicketComment,
                      WorkType, WorkLog, TimeTrack, TicketNote, TicketHistory,
                      TicketAttachment, Notification, CompanyEvent, EventLabel, Profile, Department,
-                     Skill, ProfileSkill)
+                     Skill, ProfileSkill, TimeRollup, TicketTombstone, AttachmentUpload, with_user_workload)
 from .serializers import *
+from .pagination import CreatedAtCursorPagination
+from .filters import DeclarativeFilterBackend, IndexedOrderingFilter
+from . import filters
+from . import dashboard
+from .notifications import NotificationDispatcher
+from .history import TicketChangeTracker
+from . import attachments, avatars, bulk, metrics, profiling, progress, search, timers
 
 class ProjectViewSet(viewsets.ModelViewSet):
     queryset = Project.objects.all().order_by('-created_at')
     serializer_class = ProjectSerializer
 
+    def get_queryset(self):
+        # Все счетчики проекта и его этапов считаются подзапросами - число запросов не зависит от числа проектов
+        return super().get_queryset().with_stats().prefetch_related(
+            'leads', 'participants',
+            Prefetch('stages', queryset=ProjectStage.objects.with_stats()),
+        )
+
+def snapshot_period(params):
+    # ?date_from=&date_to= (YYYY-MM-DD) для графиков по срезам api/progress.py; None - формат неверный
+    date_from = parse_date(params['date_from']) if params.get('date_from') else None
+    date_to = parse_date(params['date_to']) if params.get('date_to') else None
+    if (params.get('date_from') and not date_from) or (params.get('date_to') and not date_to): return None
+    return date_from, date_to
+
 class ProjectReleaseViewSet(viewsets.ModelViewSet):
     queryset = ProjectRelease.objects.all().order_by('-created_at')
     serializer_class = ProjectReleaseSerializer
 
     def get_queryset(self):
-        qs = super().get_queryset()
+        if self.action == 'progress': return super().get_queryset()
+        qs = super().get_queryset().prefetch_related(
+            Prefetch('stages', queryset=ProjectStage.objects.with_stats().select_related('project')),
+        )
         project_id = self.request.query_params.get('project')
         if project_id:
             qs = qs.filter(project_id=project_id)
@@ -33,92 +68,203 @@ class ProjectReleaseViewSet(viewsets.ModelViewSet):
         release.save()
         return Response({'status': 'PUBLISHED'})
 
+    @action(detail=True, methods=['get'])
+    def progress(self, request, pk=None):
+        period = snapshot_period(request.query_params)
+        if period is None:
+            return Response({'error': 'Dates must be in YYYY-MM-DD format.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(progress.release_progress(self.get_object(), *period))
+
 class ProjectStageViewSet(viewsets.ModelViewSet):
     queryset = ProjectStage.objects.all().order_by('-created_at')
     serializer_class = ProjectStageSerializer
 
     def get_queryset(self):
-        qs = super().get_queryset()
+        # Burndown читает только срезы - счетчики этапа ему не нужны
+        if self.action == 'burndown': return super().get_queryset()
+        qs = super().get_queryset().with_stats().select_related('project')
         project_id = self.request.query_params.get('project')
         if project_id:
             qs = qs.filter(project_id=project_id)
         return qs
 
+    @action(detail=True, methods=['get'])
+    def burndown(self, request, pk=None):
+        period = snapshot_period(request.query_params)
+        if period is None:
+            return Response({'error': 'Dates must be in YYYY-MM-DD format.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(progress.stage_burndown(self.get_object(), *period))
+
+def with_ticket_list_related(qs, request=None):
+    # Подгружает все, что нужно TicketListSerializer, фиксированным числом запросов; без request - без ?expand=
+    qs = qs.select_related('project', 'stage', 'assignee__profile').prefetch_related('tags')
+    expandable_prefetch = TicketListSerializer.Meta.expandable_prefetch
+    for name in split_query_param(request.query_params.get('expand') if request else None):
+        qs = qs.prefetch_related(*expandable_prefetch.get(name, []))
+    return qs
+
+def filter_by_tags(qs, tag_ids):
+    # Подзапрос по through-таблице вместо JOIN - без дублей строк и без distinct()
+    return qs.filter(id__in=Ticket.tags.through.objects.filter(tag_id__in=tag_ids).values('ticket_id'))
+
 class TicketViewSet(viewsets.ModelViewSet):
-    queryset = Ticket.objects.all().order_by('-created_at')
+    queryset = Ticket.objects.all()
     serializer_class = TicketSerializer
+    pagination_class = CreatedAtCursorPagination
+    filter_backends = [DeclarativeFilterBackend, IndexedOrderingFilter]
+    filter_fields = {
+        'project': ('project_id', filters.integer),
+        'assignee': ('assignee_id', filters.integer),
+        'creator': ('creator_id', filters.integer),
+        'stage': ('stage_id', filters.integer),
+        'status': ('status__in', filters.choice_list(Ticket._meta.get_field('status').choices)),
+        'priority': ('priority__in', filters.choice_list(Ticket._meta.get_field('priority').choices)),
+        'tag': (filter_by_tags, filters.integer_list),
+        'due_after': ('due_date__gte', filters.moment),
+        'due_before': ('due_date__lte', filters.moment),
+        'updated_since': ('updated_at__gte', filters.moment),
+    }
+    # Только поля с индексами (ticket_created_idx, ticket_updated_idx); nullable due_date не годится для курсора
+    ordering_fields = ['created_at', 'updated_at', 'id']
+    ordering = ['-created_at', '-id']
+
+    def get_serializer_class(self):
+        if self.action == 'list': return TicketListSerializer
+        return super().get_serializer_class()
 
     def get_queryset(self):
         qs = super().get_queryset()
-        project_id = self.request.query_params.get('project')
-        assignee_id = self.request.query_params.get('assignee')
-        if project_id:
-            qs = qs.filter(project_id=project_id)
-        if assignee_id:
-            qs = qs.filter(assignee_id=assignee_id)
+        # changes отдает те же TicketListSerializer - и подгрузка та же
+        if self.action in ('list', 'changes'):
+            qs = with_ticket_list_related(qs, self.request)
         return qs
 
     def perform_create(self, serializer):
         ticket = serializer.save(creator=self.request.user)
-        if ticket.assignee and ticket.assignee != self.request.user:
-            Notification.objects.create(user=ticket.assignee, message=f"На вас назначена новая задача #{ticket.id}: {ticket.title}", link=f"/tickets/{ticket.id}")
+        notifications = NotificationDispatcher(actor=self.request.user)
+        notifications.add([ticket.assignee_id], f"На вас назначена новая задача #{ticket.id}: {ticket.title}", f"/tickets/{ticket.id}")
+        notifications.add_ticket_audience(ticket, f"Новая задача #{ticket.id}: {ticket.title}")
+        notifications.dispatch()
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        # Дельта-синхронизация: задачи, измененные после водяного знака ?since=, и удаленные (по TicketTombstone).
+        # Знак - подписанный keyset (updated_at, id, id последнего tombstone). Верхняя граница now - TICKET_SYNC_LAG
+        # дает поздно закоммиченным транзакциям попасть в следующий опрос, а не потеряться.
+        try:
+            mark = signing.loads(request.query_params['since'], salt='tickets.changes') if request.query_params.get('since') else None
+        except signing.BadSignature:
+            return Response({'error': 'Invalid since token.'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = settings.TICKET_SYNC_BATCH_SIZE
+        until = timezone.now() - timedelta(seconds=settings.TICKET_SYNC_LAG)
+
+        changed = self.filter_queryset(self.get_queryset()).filter(updated_at__lt=until).order_by('updated_at', 'id')
+        tombstones = TicketTombstone.objects.filter(deleted_at__lt=until).order_by('id')
+        if mark:
+            since = datetime.fromisoformat(mark['u'])
+            changed = changed.filter(Q(updated_at__gt=since) | Q(updated_at=since, id__gt=mark['i']))
+            tombstones = tombstones.filter(id__gt=mark['t'])
+        else:
+            tombstones = tombstones.none()  # первая синхронизация - полный снимок, удалять нечего
+        if request.query_params.get('project'):
+            tombstones = tombstones.filter(project_id=request.query_params['project'])
+
+        changed = list(changed[:limit + 1])
+        has_more = len(changed) > limit
+        changed = changed[:limit]
+        deleted = list(tombstones.values_list('id', 'ticket_id')[:limit])
+
+        if has_more:
+            new_mark = {'u': changed[-1].updated_at.isoformat(), 'i': changed[-1].id}
+        else:
+            # Догнали: все строки до верхней границы отданы - следующий опрос начнется с нее
+            new_mark = {'u': until.isoformat(), 'i': 0}
+        if deleted: new_mark['t'] = deleted[-1][0]
+        elif mark: new_mark['t'] = mark['t']
+        else: new_mark['t'] = TicketTombstone.objects.aggregate(last=Max('id'))['last'] or 0
+        return Response({
+            'changed': TicketListSerializer(changed, many=True, context={'request': request}).data,
+            'deleted': [ticket_id for _, ticket_id in deleted],
+            'watermark': signing.dumps(new_mark, salt='tickets.changes'),
+            'has_more': has_more or len(deleted) == limit,
+        })
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': 'Query parameter q is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            page = max(int(request.query_params.get('page', 1)), 1)
+            page_size = min(max(int(request.query_params.get('page_size', api_settings.PAGE_SIZE)), 1), settings.API_MAX_PAGE_SIZE)
+        except ValueError:
+            return Response({'error': 'page and page_size must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+        total, ids = search.search_ticket_ids(query, page_size, (page - 1) * page_size)
+        tickets = with_ticket_list_related(Ticket.objects.filter(id__in=ids), request).in_bulk(ids)
+        ranked = [tickets[ticket_id] for ticket_id in ids if ticket_id in tickets]
+        return Response({
+            'count': total,
+            'page': page,
+            'next_page': page + 1 if page * page_size < total else None,
+            'results': TicketListSerializer(ranked, many=True, context={'request': request}).data,
+        })
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        try:
+            result = bulk.apply_ticket_operations(request.user, self.get_queryset(), request.data.get('operations'))
+        except bulk.BulkError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
 
     @action(detail=True, methods=['post'])
     def start_timer(self, request, pk=None):
         ticket = self.get_object()
         work_type_id = request.data.get('work_type')
-        work_type = WorkType.objects.get(id=work_type_id) if work_type_id else None
-
-        # Закрываем предыдущие активные таймеры
-        TimeTrack.objects.filter(user=request.user, end_time__isnull=True).update(end_time=timezone.now())
-
-        TimeTrack.objects.create(ticket=ticket, user=request.user, work_type=work_type)
-        return Response({'status': 'timer started'})
+        work_type = WorkType.objects.filter(id=work_type_id).first() if work_type_id else None
+        if work_type_id and work_type is None:
+            return Response({'error': 'Unknown work type.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            track = timers.start_timer(request.user, ticket, work_type)
+        except IntegrityError:
+            # Параллельный запрос успел открыть таймер - сработало ограничение timetrack_one_open_per_user
+            return Response({'error': 'Another timer was started at the same time.'}, status=status.HTTP_409_CONFLICT)
+        return Response({'status': 'timer started', 'active_timer': timers.active_timer_payload(track)})
 
     @action(detail=True, methods=['post'])
     def stop_timer(self, request, pk=None):
         ticket = self.get_object()
-        active_track = TimeTrack.objects.filter(user=request.user, ticket=ticket, end_time__isnull=True).first()
-        if not active_track:
-            return Response({'error': 'No active timer for this ticket.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        active_track.end_time = timezone.now()
-        active_track.save()
-
-        duration_sec = (active_track.end_time - active_track.start_time).total_seconds()
-        minutes = int(duration_sec // 60)
-        seconds = int(duration_sec % 60)
-
-        if minutes == 0 and seconds == 0: seconds = 1
-
-        WorkLog.objects.create(
-            ticket=ticket,
-            user=request.user,
-            work_type=active_track.work_type,
-            time_spent_minutes=minutes,
-            time_spent_seconds=seconds,
-            comment="Автоматический трекинг"
-        )
-        return Response({'status': 'stopped', 'duration_minutes': minutes, 'duration_seconds': seconds})
+        try:
+            log = timers.stop_timer(request.user, ticket)
+        except timers.TimerError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'status': 'stopped', 'duration_minutes': log.time_spent_minutes, 'duration_seconds': log.time_spent_seconds})
 
     def perform_update(self, serializer):
-        old_instance = self.get_object()
-        updated_instance = serializer.save()
-        changes = []
-        if old_instance.status != updated_instance.status: changes.append(f"статус с '{old_instance.get_status_display()}' на '{updated_instance.get_status_display()}'")
-        if old_instance.priority != updated_instance.priority: changes.append(f"приоритет с '{old_instance.get_priority_display()}' на '{updated_instance.get_priority_display()}'")
-        if changes: TicketHistory.objects.create(ticket=updated_instance, user=self.request.user, action="Изменил " + ", ".join(changes))
-        if old_instance.assignee != updated_instance.assignee and updated_instance.assignee:
-            Notification.objects.create(user=updated_instance.assignee, message=f"На вас переназначена задача #{updated_instance.id}: {updated_instance.title}", link=f"/tickets/{updated_instance.id}")
+        # Снимок берется с уже загруженного DRF экземпляра - без повторного get_object()
+        tracker = TicketChangeTracker(serializer.instance, fields=serializer.validated_data.keys())
+        ticket = serializer.save()
+        changes = tracker.changes()
+        if not changes: return
+        history = TicketHistory.objects.bulk_create(tracker.history_rows(self.request.user, changes))
+        changed = {field for field, _, _ in changes}
+        notifications = NotificationDispatcher(actor=self.request.user)
+        if 'assignee' in changed:
+            notifications.add([ticket.assignee_id], f"На вас переназначена задача #{ticket.id}: {ticket.title}", f"/tickets/{ticket.id}")
+        if changed & {'status', 'priority', 'stage', 'due_date'}:
+            summary = '; '.join(row.action for row in history if row.field in ('status', 'priority', 'stage', 'due_date'))
+            notifications.add_ticket_audience(ticket, f"Задача #{ticket.id}: {self.request.user.username}: {summary}")
+        notifications.dispatch()
 
 class TicketCommentViewSet(viewsets.ModelViewSet):
-    queryset = TicketComment.objects.all().order_by('-created_at')
+    queryset = TicketComment.objects.all().order_by('-created_at', '-id')
     serializer_class = TicketCommentSerializer
+    pagination_class = CreatedAtCursorPagination
     def perform_create(self, serializer):
         comment = serializer.save(author=self.request.user)
-        ticket = comment.ticket
-        if ticket.assignee and ticket.assignee != self.request.user:
-            Notification.objects.create(user=ticket.assignee, message=f"Новый комментарий в задаче #{ticket.id} от {self.request.user.username}", link=f"/tickets/{ticket.id}")
+        notifications = NotificationDispatcher(actor=self.request.user)
+        notifications.add_ticket_audience(comment.ticket, f"Новый комментарий в задаче #{comment.ticket_id} от {self.request.user.username}")
+        notifications.dispatch()
 
 class TicketNoteViewSet(viewsets.ModelViewSet):
     queryset = TicketNote.objects.all().order_by('-created_at')
@@ -130,28 +276,204 @@ class TicketAttachmentViewSet(viewsets.ModelViewSet):
     queryset = TicketAttachment.objects.all().order_by('-created_at')
     serializer_class = TicketAttachmentSerializer
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        # Небольшие файлы одним multipart-запросом; большие - через /api/attachment-uploads/ по частям
+        uploaded = serializer.validated_data['file']
+        if uploaded.size > settings.ATTACHMENT_MAX_SIZE:
+            raise ValidationError({'file': f'File is larger than {settings.ATTACHMENT_MAX_SIZE} bytes.'})
+        name, digest, size = attachments.store_uploaded_file(uploaded)
+        serializer.save(user=self.request.user, file=name, filename=serializer.validated_data.get('filename') or uploaded.name,
+                        sha256=digest, size=size)
+
+    # Ссылки для <a>/<img> не несут токен - доступ по подписи из download_url/thumbnail_url или по обычной авторизации
+    @action(detail=True, methods=['get'], permission_classes=[permissions.AllowAny])
+    def download(self, request, pk=None):
+        attachment = self.get_object()
+        if not (request.user.is_authenticated or attachments.check_signature(request, attachment, 'download')):
+            return Response({'error': 'Invalid or expired link.'}, status=status.HTTP_403_FORBIDDEN)
+        return attachments.file_response(request, attachment.file.name, attachment.filename, attachments.etag(attachment),
+                                         as_attachment=request.query_params.get('inline') != '1')
+
+    @action(detail=True, methods=['get'], permission_classes=[permissions.AllowAny])
+    def thumbnail(self, request, pk=None):
+        attachment = self.get_object()
+        if not (request.user.is_authenticated or attachments.check_signature(request, attachment, 'thumbnail')):
+            return Response({'error': 'Invalid or expired link.'}, status=status.HTTP_403_FORBIDDEN)
+        name = attachments.thumbnail(attachment)
+        if name is None:
+            return Response({'error': 'No preview for this file.'}, status=status.HTTP_404_NOT_FOUND)
+        return attachments.file_response(request, name, f'{os.path.splitext(attachment.filename)[0]}.jpg',
+                                         f'"{os.path.basename(name)}"', as_attachment=False)
+
+class AttachmentUploadViewSet(viewsets.ViewSet):
+    # Загрузка по частям: POST {ticket, filename, size} -> id; PUT /{id}/ с телом части и Content-Range;
+    # GET /{id}/ - сколько уже принято (для докачки после обрыва); DELETE - отмена
+    def create(self, request):
+        ticket = Ticket.objects.filter(id=request.data.get('ticket')).first() if str(request.data.get('ticket', '')).isdigit() else None
+        if ticket is None:
+            return Response({'error': 'Unknown ticket.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not request.data.get('filename') or not str(request.data.get('size', '')).isdigit():
+            return Response({'error': 'filename and size are required.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            upload = attachments.start_upload(request.user, ticket, request.data['filename'], int(request.data['size']))
+        except attachments.UploadError as e:
+            return Response({'error': str(e)}, status=e.status)
+        return Response({'id': upload.id, 'offset': 0, 'size': upload.size, 'chunk_size': settings.ATTACHMENT_CHUNK_SIZE},
+                        status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, pk=None):
+        upload = AttachmentUpload.objects.filter(id=pk, user=request.user).first()
+        if upload is None:
+            return Response({'error': 'Upload not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'id': upload.id, 'offset': upload.offset, 'size': upload.size})
+
+    def update(self, request, pk=None):
+        try:
+            upload, attachment = attachments.append_chunk(pk, request.user, request.stream, request.headers.get('Content-Range'))
+        except attachments.UploadError as e:
+            current = AttachmentUpload.objects.filter(id=pk, user=request.user).values_list('offset', flat=True).first()
+            return Response({'error': str(e), 'offset': current}, status=e.status)
+        if attachment is None:
+            return Response({'id': upload.id, 'offset': upload.offset, 'size': upload.size})
+        return Response(TicketAttachmentSerializer(attachment, context={'request': request}).data, status=status.HTTP_201_CREATED)
+
+    def destroy(self, request, pk=None):
+        upload = AttachmentUpload.objects.filter(id=pk, user=request.user).first()
+        if upload is None:
+            return Response({'error': 'Upload not found.'}, status=status.HTTP_404_NOT_FOUND)
+        attachments.abort_upload(upload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 class NotificationViewSet(viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
+    pagination_class = CreatedAtCursorPagination
     def get_queryset(self):
-        return Notification.objects.filter(user=self.request.user).order_by('-created_at')
+        return Notification.objects.filter(user=self.request.user).order_by('-created_at', '-id')
 
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
         self.get_queryset().update(is_read=True)
         return Response({'status': 'ok'})
 
+    @action(detail=False, methods=['post'])
+    def mark_read(self, request):
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            return Response({'error': 'ids must be a list of notification ids.'}, status=status.HTTP_400_BAD_REQUEST)
+        updated = self.get_queryset().filter(id__in=ids, is_read=False).update(is_read=True)
+        return Response({'status': 'ok', 'updated': updated})
+
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        # Считается по индексу notif_user_read_created_idx (user, is_read, created_at)
+        return Response({'unread_count': self.get_queryset().filter(is_read=False).count()})
+
+    @action(detail=False, methods=['get'])
+    def since(self, request):
+        # Long-poll: держим запрос, пока не появятся уведомления новее ?after= или не истечет ?wait= секунд
+        try:
+            after = int(request.query_params.get('after', 0))
+            wait = min(float(request.query_params.get('wait', 0)), settings.NOTIFICATIONS_LONG_POLL_MAX_WAIT)
+        except ValueError:
+            return Response({'error': 'after must be an integer and wait a number of seconds.'}, status=status.HTTP_400_BAD_REQUEST)
+        new_items = self.get_queryset().filter(id__gt=after)
+        deadline = time.monotonic() + max(wait, 0)
+        while not new_items.exists() and time.monotonic() < deadline:
+            time.sleep(min(settings.NOTIFICATIONS_LONG_POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+        # Не больше страницы за ответ (как /tickets/changes/): клиент со старым after дочитывает с last_id без ожидания
+        limit = self.paginator.page_size
+        notifications = list(new_items.order_by('id')[:limit + 1])
+        has_more = len(notifications) > limit
+        notifications = notifications[:limit]
+        return Response({
+            'results': self.get_serializer(notifications, many=True).data,
+            'last_id': notifications[-1].id if notifications else after,
+            'has_more': has_more,
+        })
+
 class WorkLogViewSet(viewsets.ModelViewSet):
-    queryset = WorkLog.objects.all().order_by('-created_at')
+    queryset = WorkLog.objects.all()
     serializer_class = WorkLogSerializer
+    pagination_class = CreatedAtCursorPagination
+    filter_backends = [DeclarativeFilterBackend, IndexedOrderingFilter]
+    filter_fields = {
+        'user': ('user_id', filters.integer),
+        'ticket': ('ticket_id', filters.integer),
+        'project': ('ticket__project_id', filters.integer),
+        'work_type': ('work_type_id', filters.integer),
+        'created_after': ('created_at__gte', filters.moment),
+        'created_before': ('created_at__lte', filters.moment),
+        'date_from': ('created_at__gte', filters.moment),
+        'date_to': ('created_at__lt', filters.next_day),
+    }
+    # worklog_created_idx / worklog_user_created_idx
+    ordering_fields = ['created_at', 'id']
+    ordering = ['-created_at', '-id']
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        # ?type=csv|xlsx (format занят переключателем рендереров DRF) + те же фильтры, что у списка
+        from . import timesheets  # csv/zipfile/xml нужны только здесь - не грузим их при старте процесса
+        kind = request.query_params.get('type', 'csv')
+        if kind not in ('csv', 'xlsx'):
+            return Response({'error': 'type must be csv or xlsx.'}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = self.filter_queryset(self.get_queryset())
+        filename = f"worklogs-{timezone.localdate():%Y%m%d}.{kind}"
+        if kind == 'csv':
+            response = StreamingHttpResponse(timesheets.csv_stream(queryset), content_type='text/csv; charset=utf-8')
+        else:
+            response = StreamingHttpResponse(timesheets.xlsx_stream(queryset), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_csv(self, request):
+        from . import timesheets
+        if 'file' not in request.FILES:
+            return Response({'error': 'Upload a CSV file in the "file" field.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            created = timesheets.import_csv(request.user, request.FILES['file'])
+        except timesheets.ImportFailed as e:
+            return Response({'error': str(e), 'rows': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        except UnicodeDecodeError:
+            return Response({'error': 'File must be UTF-8 encoded CSV.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'created': created}, status=status.HTTP_201_CREATED)
+
+    # TimeRollup обновляется сигналами WorkLog - в той же транзакции, что и сама запись
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+
 class UserViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
 
+    def get_serializer_class(self):
+        if self.action == 'list': return UserDirectorySerializer
+        return super().get_serializer_class()
+
+    def get_queryset(self):
+        # Список - три запроса при любом числе сотрудников; проекты только по ?expand=projects,led_projects
+        qs = with_user_workload(super().get_queryset()).select_related('profile')
+        qs = qs.prefetch_related('profile__department_links__department', 'profile__skills__skill')
+        if self.action == 'list':
+            expandable_prefetch = UserDirectorySerializer.Meta.expandable_prefetch
+            for name in split_query_param(self.request.query_params.get('expand')):
+                qs = qs.prefetch_related(*expandable_prefetch.get(name, []))
+            return qs
+        return qs.prefetch_related(
+            'led_projects',
+            Prefetch('profile__involved_projects', queryset=Project.objects.with_stats().prefetch_related(
+                Prefetch('stages', queryset=ProjectStage.objects.with_stats()))),
+        )
+
     @action(detail=False, methods=['get', 'patch'], permission_classes=[permissions.IsAuthenticated])
     def me(self, request):
         user = request.user
@@ -166,6 +488,8 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
             
             user.profile.save()
             user.save()
+            # Копии строим сразу, чтобы первый же показ аватара не ждал генерации
+            if 'avatar' in request.FILES: avatars.build_variants(user.profile)
             
             if 'skills' in request.data:
                 try:
@@ -176,9 +500,41 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
                 except Exception as e:
                     print("Ошибка сохранения навыков:", e)
 
-        serializer = self.get_serializer(user)
+        # Перечитываем с аннотациями и prefetch - после PATCH в них свежие данные
+        serializer = self.get_serializer(self.get_queryset().get(pk=user.pk))
         return Response(serializer.data)
 
+class MetricsView(viewsets.ViewSet):
+    # Гистограммы api.metrics в формате Prometheus; у каждого воркера свои, скрейпер обходит их по очереди
+    permission_classes = [permissions.IsAdminUser]
+
+    def list(self, request):
+        return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+class ProfileDumpViewSet(viewsets.ViewSet):
+    # Файлы api.profiling: список и скачивание (.prof - snakeviz/pstats, .collapsed - flamegraph/speedscope)
+    permission_classes = [permissions.IsAdminUser]
+
+    def list(self, request):
+        return Response(profiling.list_profiles())
+
+    def retrieve(self, request, pk=None):
+        path = profiling.profile_path(pk)
+        if path is None: raise Http404('Profile not found.')
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=pk, content_type='application/octet-stream')
+
+class AvatarViewSet(viewsets.ViewSet):
+    # Копии аватаров для <img> без токена: имя содержит хеш исходника, поэтому ответ кешируется навсегда
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def retrieve(self, request, pk=None):
+        name = avatars.resolve(pk)
+        if name is None:
+            return Response({'error': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return attachments.file_response(request, name, os.path.basename(name), f'"{os.path.basename(name)}"', as_attachment=False,
+                                         cache_control=f'public, max-age={365 * 24 * 3600}, immutable')
+
 class ProfileViewSet(viewsets.ModelViewSet):
     queryset = Profile.objects.all()
     serializer_class = ProfileSerializer
@@ -192,8 +548,9 @@ class WorkTypeViewSet(viewsets.ModelViewSet):
     serializer_class = WorkTypeSerializer
 
 class CompanyEventViewSet(viewsets.ModelViewSet):
-    queryset = CompanyEvent.objects.all().order_by('-created_at')
+    queryset = CompanyEvent.objects.all().order_by('-created_at', '-id')
     serializer_class = CompanyEventSerializer
+    pagination_class = CreatedAtCursorPagination
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
@@ -205,36 +562,125 @@ class SkillViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Skill.objects.all()
     serializer_class = SkillSerializer
 
+class TimerViewSet(viewsets.ViewSet):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @action(detail=False, methods=['get'])
+    def active(self, request):
+        track = timers.get_active_track(request.user)
+        payload = timers.active_timer_payload(track)
+        if payload: payload['ticket_title'] = track.ticket.title
+        return Response({'active_timer': payload})
+
+    @action(detail=False, methods=['post'])
+    def stop(self, request):
+        try:
+            log = timers.stop_timer(request.user)
+        except timers.TimerError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'status': 'stopped', 'ticket': log.ticket_id, 'duration_minutes': log.time_spent_minutes, 'duration_seconds': log.time_spent_seconds})
+
 class DashboardView(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
+    active_statuses = ['OPEN', 'IN_PROGRESS', 'REVIEW']
 
     def list(self, request):
-        user = request.user
-        today = timezone.now().date()
-        month_start = today.replace(day=1)
-        active_statuses = ['OPEN', 'IN_PROGRESS', 'REVIEW']
-
-        my_tickets = Ticket.objects.filter(assignee=user, status__in=active_statuses).order_by('-created_at')
-        my_recent_logs = WorkLog.objects.filter(user=user).order_by('-created_at')[:10]
-        
-        my_worked_today = WorkLog.objects.filter(user=user, created_at__date=today).aggregate(Sum('time_spent_minutes'))['time_spent_minutes__sum'] or 0
-        total_worked_today = WorkLog.objects.filter(created_at__date=today).aggregate(Sum('time_spent_minutes'))['time_spent_minutes__sum'] or 0
-        
-        my_completed_month = Ticket.objects.filter(assignee=user, status='DONE', updated_at__date__gte=month_start).count()
-        total_completed_month = Ticket.objects.filter(status='DONE', updated_at__date__gte=month_start).count()
-
-        stats = {
-            'my_assigned_count': my_tickets.count(),
-            'total_assigned_count': Ticket.objects.filter(status__in=active_statuses).count(),
-            'my_worked_minutes_today': my_worked_today,
-            'total_worked_minutes_today': total_worked_today,
-            'my_completed_tasks_month': my_completed_month,
-            'total_completed_tasks_month': total_completed_month,
+        global_stats = dashboard.get_cached(dashboard.global_key(), self.build_global_stats)
+        user_part = dashboard.get_cached(dashboard.user_key(request.user.id), lambda: self.build_user_part(request))
+        return Response({
+            'stats': {**user_part['stats'], **global_stats},
+            'assigned_tickets': user_part['assigned_tickets'],
+            'recent_logs': user_part['recent_logs'],
+        })
+
+    @staticmethod
+    def period_starts():
+        # Границы дня/месяца как диапазоны по datetime - так фильтры попадают в индексы (created_at__date их обходит)
+        today_start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        return today_start, today_start.replace(day=1)
+
+    def build_global_stats(self):
+        today_start, month_start = self.period_starts()
+        return {
+            'total_assigned_count': Ticket.objects.filter(status__in=self.active_statuses).count(),
+            'total_worked_minutes_today': TimeRollup.objects.filter(day=today_start.date()).aggregate(Sum('minutes'))['minutes__sum'] or 0,
+            'total_completed_tasks_month': Ticket.objects.filter(status='DONE', updated_at__gte=month_start).count(),
             'total_projects': Project.objects.filter(status='ACTIVE').count(),
         }
-        
+
+    def build_user_part(self, request):
+        user = request.user
+        today_start, month_start = self.period_starts()
+        # Кешируется на весь день для любых вариантов запроса - ?fields=/?expand= вызывающего сюда не попадают
+        my_tickets = with_ticket_list_related(Ticket.objects.filter(assignee=user, status__in=self.active_statuses).order_by('-created_at'))
+        my_recent_logs = WorkLog.objects.filter(user=user).select_related('user__profile', 'work_type__parent').order_by('-created_at')[:10]
+        assigned_tickets = TicketListSerializer(my_tickets, many=True, context={'request': request, 'field_selection': False}).data
+        return {
+            'stats': {
+                'my_assigned_count': len(assigned_tickets),
+                'my_worked_minutes_today': TimeRollup.objects.filter(user=user, day=today_start.date()).aggregate(Sum('minutes'))['minutes__sum'] or 0,
+                'my_completed_tasks_month': Ticket.objects.filter(assignee=user, status='DONE', updated_at__gte=month_start).count(),
+            },
+            'assigned_tickets': assigned_tickets,
+            'recent_logs': WorkLogBriefSerializer(my_recent_logs, many=True).data,
+        }
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+class ReportsView(viewsets.ViewSet):
+    permission_classes = [permissions.IsAuthenticated]
+    PERIODS = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+
+    def list(self, request):
+        params = request.query_params
+        date_from = parse_date(params['date_from']) if params.get('date_from') else None
+        date_to = parse_date(params['date_to']) if params.get('date_to') else None
+        if (params.get('date_from') and not date_from) or (params.get('date_to') and not date_to):
+            return Response({'error': 'Dates must be in YYYY-MM-DD format.'}, status=status.HTTP_400_BAD_REQUEST)
+        period = params.get('period', 'day')
+        if period not in self.PERIODS:
+            return Response({'error': f"period must be one of: {', '.join(self.PERIODS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            project_id = filters.integer(params['project']) if params.get('project') else None
+            user_id = filters.integer(params['user']) if params.get('user') else None
+        except ValueError:
+            return Response({'error': 'project and user must be integer ids.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        logs = TimeRollup.objects.all()
+        done_tickets = Ticket.objects.filter(status='DONE')
+        if date_from:
+            logs = logs.filter(day__gte=date_from)
+            done_tickets = done_tickets.filter(updated_at__gte=day_start(date_from))
+        if date_to:
+            logs = logs.filter(day__lte=date_to)
+            done_tickets = done_tickets.filter(updated_at__lt=day_start(date_to + timedelta(days=1)))
+        if project_id is not None:
+            logs = logs.filter(project_id=project_id)
+            done_tickets = done_tickets.filter(project_id=project_id)
+        if user_id is not None:
+            logs = logs.filter(user_id=user_id)
+            done_tickets = done_tickets.filter(assignee_id=user_id)
+
+        # Каждая группировка - один GROUP BY запрос по TimeRollup, в ответ уходят только агрегаты
+        totals = logs.aggregate(minutes=Sum('minutes'), logs_count=Sum('logs_count'))
+        by_project = logs.values('project_id', project_name=F('project__name')) \
+            .annotate(minutes=Sum('minutes')).order_by('-minutes')
+        by_user = logs.values('user_id', username=F('user__username'), first_name=F('user__first_name'), last_name=F('user__last_name')) \
+            .annotate(minutes=Sum('minutes')).order_by('-minutes')
+        by_work_type = logs.values('work_type_id', work_type_name=F('work_type__name')) \
+            .annotate(minutes=Sum('minutes')).order_by('-minutes')
+        by_period = logs.annotate(period=self.PERIODS[period]('day')).values('period') \
+            .annotate(minutes=Sum('minutes')).order_by('period')
+
         return Response({
-            'stats': stats, 
-            'assigned_tickets': TicketSerializer(my_tickets, many=True, context={'request': request}).data, 
-            'recent_logs': WorkLogSerializer(my_recent_logs, many=True).data
-        })
\ No newline at end of file
+            'totals': {
+                'minutes': totals['minutes'] or 0,
+                'logs_count': totals['logs_count'] or 0,
+                'done_tickets_count': done_tickets.count(),
+            },
+            'by_project': list(by_project),
+            'by_user': list(by_user),
+            'by_work_type': list(by_work_type),
+            'by_period': list(by_period),
+        })
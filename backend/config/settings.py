@@ -36,12 +36,16 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    # После WhiteNoise: статика в метрики не попадает; сессии и авторизация - попадают
+    'api.metrics.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Последним: в профиль попадают view, сериализаторы и рендеринг, а не остальные middleware
+    'api.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -67,26 +71,99 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Настройки берутся из окружения: DB_ENGINE=sqlite (по умолчанию, файл db.sqlite3) или mysql / mariadb (продакшен).
+# Бэкенды api.db.* - стандартные бэкенды Django с пулом соединений процесса (api/db/pooling.py)
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+# Пул: DB_POOL_SIZE > 0 - закрытые Django соединения возвращаются в пул и достаются любому потоку воркера;
+# срок жизни соединения в пуле должен быть меньше wait_timeout MySQL
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
+DB_POOL_MAX_LIFETIME = int(os.environ.get('DB_POOL_MAX_LIFETIME', 300))
+# Постоянное соединение потока (сек). С пулом по умолчанию 0: соединение уходит в пул в конце каждого запроса
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 0 if DB_POOL_SIZE else 60))
+# Ограничение времени одного запроса (мс, 0 - без ограничения): MySQL max_execution_time (только SELECT),
+# MariaDB max_statement_time. Сетевые таймауты чтения/записи - страховка на случай зависшего сервера
+DB_QUERY_TIMEOUT_MS = int(os.environ.get('DB_QUERY_TIMEOUT_MS', 0))
+DB_READ_TIMEOUT = int(os.environ.get('DB_READ_TIMEOUT', 60))
+
+if DB_ENGINE in ('mysql', 'mariadb'):
+    init_command = "SET sql_mode='STRICT_TRANS_TABLES'"
+    if DB_QUERY_TIMEOUT_MS and DB_ENGINE == 'mysql':
+        init_command += f', SESSION max_execution_time={DB_QUERY_TIMEOUT_MS}'
+    elif DB_QUERY_TIMEOUT_MS:
+        init_command += f', SESSION max_statement_time={DB_QUERY_TIMEOUT_MS / 1000}'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'api.db.mysql',
+            'NAME': os.environ.get('DB_NAME', 'inn_support_db'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '3306'),
+            'OPTIONS': {
+                'init_command': init_command,
+                'charset': 'utf8mb4',
+                'connect_timeout': 5,
+                'read_timeout': DB_READ_TIMEOUT,
+                'write_timeout': DB_READ_TIMEOUT,
+            },
+        }
     }
-}
-# Uncomment for Production (MySQL)
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.mysql',
-#         'NAME': 'inn_support_db', 
-#         'USER': 'admin_user',
-#         'PASSWORD': 'password',
-#         'HOST': 'localhost',
-#         'PORT': '3306',
-#         'OPTIONS': {
-#             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
-#         },
-#     }
-# }
+else:
+    # timeout - ожидание блокировки записи в SQLite (сек); ограничения на время запроса у SQLite нет
+    DATABASES = {
+        'default': {
+            'ENGINE': 'api.db.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {'timeout': 20},
+        }
+    }
+DATABASES['default'].update({
+    'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+    # Перед повторным использованием постоянного соединения Django проверяет, что оно живо
+    'CONN_HEALTH_CHECKS': True,
+    'POOL_SIZE': DB_POOL_SIZE,
+    'POOL_MAX_LIFETIME': DB_POOL_MAX_LIFETIME,
+})
+
+
+# Cache
+# По умолчанию кеш в памяти процесса; CACHE_BACKEND=file или CACHE_BACKEND=db делают его общим для воркеров Passenger
+# (для db нужно один раз выполнить `python manage.py createcachetable`)
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+if CACHE_BACKEND == 'file':
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': BASE_DIR / 'cache'}}
+elif CACHE_BACKEND == 'db':
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'api_cache'}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'innsupport'}}
+
+# Время жизни кеша дашборда (сек); точечная инвалидация - в api/dashboard.py
+DASHBOARD_CACHE_TIMEOUT = 300
+
+
+# Уведомления пишутся пачкой после коммита; при NOTIFICATIONS_ASYNC - в фоновом потоке, вне ответа на запрос.
+# По умолчанию синхронно: очередь живет в памяти воркера и не переживает его жесткого перезапуска
+NOTIFICATIONS_ASYNC = os.environ.get('NOTIFICATIONS_ASYNC', '0') == '1'
+# Пачек в очереди фонового потока; при переполнении пачка пишется синхронно
+NOTIFICATIONS_QUEUE_SIZE = 1000
+# Одинаковое уведомление тому же пользователю в пределах окна (сек) не дублируется
+NOTIFICATIONS_DEDUP_WINDOW = 60
+
+# Long-poll /api/notifications/since/: максимальное ожидание и период опроса БД (сек)
+NOTIFICATIONS_LONG_POLL_MAX_WAIT = 25
+NOTIFICATIONS_LONG_POLL_INTERVAL = 1
+
+
+# /api/tickets/changes/: строк за один ответ и запаздывание водяного знака (сек) для поздних коммитов
+TICKET_SYNC_BATCH_SIZE = 500
+TICKET_SYNC_LAG = 2
+
+# Максимум операций в одном POST /api/tickets/bulk/
+TICKET_BULK_MAX_OPERATIONS = 1000
+
+# Импорт трудозатрат из CSV: строк в одном bulk_create и максимум ошибок в ответе
+WORKLOG_IMPORT_BATCH_SIZE = 1000
+WORKLOG_IMPORT_MAX_ERRORS = 50
 
 
 # Password validation
@@ -144,7 +221,15 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'PAGE_SIZE': 50,
 }
+# Пагинация включается на уровне вьюсетов (pagination_class), PAGE_SIZE - только размер страницы по умолчанию
+SILENCED_SYSTEM_CHECKS = ['rest_framework.W001']
+
+# Курсорная пагинация списков (api.pagination.CreatedAtCursorPagination)
+API_MAX_PAGE_SIZE = 500
+# Пока True, списки без ?cursor= / ?page_size= отдаются целиком - фронтенд переходит на страницы постепенно
+API_PAGINATION_COMPAT = True
 
 CORS_ALLOW_ALL_ORIGINS = True # For dev
 
@@ -152,4 +237,66 @@ CORS_ALLOW_ALL_ORIGINS = True # For dev
 import os
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
\ No newline at end of file
+MEDIA_ROOT = BASE_DIR / 'media'
+# Вложения (api/attachments.py): лимит размера файла, максимальный размер одной части при загрузке по частям,
+# каталог недозагруженных файлов (на той же ФС, что MEDIA_ROOT) и время жизни незавершенной загрузки
+ATTACHMENT_MAX_SIZE = 500 * 1024 * 1024
+ATTACHMENT_CHUNK_SIZE = 8 * 1024 * 1024
+ATTACHMENT_UPLOAD_TEMP_DIR = MEDIA_ROOT / 'uploads'
+ATTACHMENT_UPLOAD_EXPIRY_HOURS = 24
+ATTACHMENT_THUMBNAIL_SIZE = 320
+# Подписанные ссылки на скачивание живут сутки; браузер кеширует файл по ETag (хеш содержимого)
+ATTACHMENT_URL_MAX_AGE = 24 * 3600
+ATTACHMENT_CACHE_MAX_AGE = 24 * 3600
+# Отдача файла веб-сервером вместо Python-процесса: 'X-Accel-Redirect' (nginx, internal location с alias на MEDIA_ROOT)
+# или 'X-Sendfile' (Apache mod_xsendfile). Пусто - Django отдает файл сам, с поддержкой Range
+ATTACHMENT_SENDFILE_HEADER = os.environ.get('ATTACHMENT_SENDFILE_HEADER', '')
+ATTACHMENT_SENDFILE_PREFIX = '/protected-media/'
+
+# Размеры уменьшенных копий аватаров (px, квадрат; с запасом на экраны 2x): sm - кружки 32px, md - карточки команды, lg - профиль
+AVATAR_VARIANT_SIZES = {'sm': 64, 'md': 160, 'lg': 320}
+
+# Бюджеты команды benchmark_api на один ответ: число SQL-запросов (не должно расти с объемом данных) и p95 в мс
+# при объеме данных по умолчанию. None - не проверять
+API_BENCHMARK_BUDGETS = {
+    'projects': {'queries': 6, 'p95_ms': 400},
+    'tickets': {'queries': 4, 'p95_ms': 3000},
+    'tickets_page': {'queries': 4, 'p95_ms': 250},
+    'tickets_changes': {'queries': 5, 'p95_ms': 3000},
+    'dashboard': {'queries': 12, 'p95_ms': 300},
+    'users': {'queries': 15, 'p95_ms': 500},
+    'stages': {'queries': 3, 'p95_ms': 200},
+}
+
+# Метрики запросов (api.metrics): заголовок Server-Timing, гистограммы по маршрутам на /api/_metrics/ (только staff),
+# медленные запросы и N+1 (одна форма SQL повторилась N раз за запрос) - в журнал с ротацией
+REQUEST_METRICS_ENABLED = os.environ.get('REQUEST_METRICS_ENABLED', '1') == '1'
+REQUEST_SLOW_MS = int(os.environ.get('REQUEST_SLOW_MS', 1000))
+REQUEST_N_PLUS_ONE_THRESHOLD = 10
+REQUEST_LOG_FILE = os.environ.get('REQUEST_LOG_FILE', str(BASE_DIR / 'logs' / 'requests.log'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(process)d %(levelname)s %(message)s'},
+    },
+    'handlers': {
+        'request_log': {
+            'class': 'api.metrics.RotatingLogFileHandler', 'filename': REQUEST_LOG_FILE,
+            'maxBytes': 10 * 1024 * 1024, 'backupCount': 5, 'delay': True, 'formatter': 'plain',
+        },
+    },
+    'loggers': {
+        'api.metrics': {'handlers': ['request_log'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# Профилирование запросов (api.profiling): сотрудник присылает X-Profile: 1|pstats|collapsed или ?_profile=...,
+# либо запрос попадает в случайную выборку PROFILE_SAMPLE_RATE (0 - выключено). Файлы - в PROFILE_DIR, список на /api/_profiles/
+PROFILE_ENABLED = os.environ.get('PROFILE_ENABLED', '1') == '1'
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_FORMAT = 'pstats'  # 'pstats' (cProfile) или 'collapsed' (стек-семплер, меньше искажает время)
+PROFILE_SAMPLE_INTERVAL_MS = 2
+PROFILE_DIR = os.environ.get('PROFILE_DIR', str(BASE_DIR / 'profiles'))
+PROFILE_MAX_FILES = 200
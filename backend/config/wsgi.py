@@ -1,7 +1,32 @@
 
 import os
+import time
+
+_import_started = time.perf_counter()
+
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# STARTUP_PROFILE=1: время загрузки приложения и первого запроса печатается в stderr (лог Passenger).
+# Локальный замер в чистом процессе с разбивкой по модулям: python manage.py profile_startup
+if os.environ.get('STARTUP_PROFILE'):
+    import sys
+    from django.db import connection
+
+    _loaded = time.perf_counter()
+    print(f"startup: import config.wsgi {1000 * (_loaded - _import_started):.0f} ms, "
+          f"db connected: {connection.connection is not None}", file=sys.stderr)
+    _django_application = application
+    _first_request = [True]
+
+    def application(environ, start_response):
+        if not _first_request: return _django_application(environ, start_response)
+        _first_request.clear()
+        started = time.perf_counter()
+        try:
+            return _django_application(environ, start_response)
+        finally:
+            print(f"startup: first request {environ.get('PATH_INFO')} {1000 * (time.perf_counter() - started):.0f} ms", file=sys.stderr)
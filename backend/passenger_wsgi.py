@@ -2,12 +2,14 @@
 import sys, os
 
 # Adjust paths as needed
-INTERP = "/usr/bin/python3" # Typically for shared hosting, might need adjustment
-if sys.executable != INTERP:
+# Интерпретатор проекта (обычно python из virtualenv). Лучше указать его Passenger напрямую (PassengerPython в .htaccess) -
+# тогда перезапуск не нужен. Сравниваем реальные пути: /usr/bin/python3 - обычно симлинк, и строковое сравнение
+# заставляло каждый новый процесс запускать интерпретатор второй раз
+INTERP = os.environ.get('PASSENGER_PYTHON', "/usr/bin/python3") # Typically for shared hosting, might need adjustment
+if os.path.exists(INTERP) and os.path.realpath(sys.executable) != os.path.realpath(INTERP):
     os.execl(INTERP, INTERP, *sys.argv)
 
-sys.path.append(os.getcwd())
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 os.environ['DJANGO_SETTINGS_MODULE'] = 'config.settings'
 
-from django.core.wsgi import get_wsgi_application
-application = get_wsgi_application()
+from config.wsgi import application
@@ -91,7 +91,7 @@ const SubNavigation = ({ location }) => {
 
     const currentUser = JSON.parse(localStorage.getItem('currentUser') || '{}');
     const userInitial = currentUser.first_name ? currentUser.first_name[0].toUpperCase() : (currentUser.username ? currentUser.username[0].toUpperCase() : 'A');
-    const avatarUrl = currentUser.profile?.avatar;
+    const avatarUrl = currentUser.profile?.avatar_variants?.sm?.webp || currentUser.profile?.avatar;
 
     return (
         <div className="top-bar-container" style={{ position: 'relative' }}>
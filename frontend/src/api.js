@@ -19,30 +19,64 @@ export const login = (username, password) => api.post('/token/', { username, pas
 export const getProjects = () => api.get('/projects/');
 export const getProject = (id) => api.get(`/projects/${id}/`);
 export const createProject = (data) => api.post('/projects/', data);
-export const getTickets = () => api.get('/tickets/');
+export const getTickets = (params) => api.get('/tickets/', { params });
 export const getTicket = (id) => api.get(`/tickets/${id}/`);
+export const getTicketChanges = (since, params) => api.get('/tickets/changes/', { params: { ...params, since } });
+export const searchTickets = (q, page = 1) => api.get('/tickets/search/', { params: { q, page } });
+export const bulkUpdateTickets = (operations) => api.post('/tickets/bulk/', { operations });
 export const createTicket = (data) => api.post('/tickets/', data);
 export const updateTicket = (id, data) => api.patch(`/tickets/${id}/`, data);
 export const getDashboardStats = () => api.get('/dashboard/');
-export const getUsers = () => api.get('/users/');
+export const getReports = (params) => api.get('/reports/', { params });
+export const getUsers = (params) => api.get('/users/', { params });
+export const getUser = (id) => api.get(`/users/${id}/`);
 export const getCurrentUser = () => api.get('/users/me/');
 
 export const startTimer = (id, data) => api.post(`/tickets/${id}/start_timer/`, data);
 export const stopTimer = (id) => api.post(`/tickets/${id}/stop_timer/`);
+export const getActiveTimer = () => api.get('/timers/active/');
 
 export const createComment = (data) => api.post('/comments/', data);
 export const createNote = (data) => api.post('/notes/', data);
 export const getWorkTypes = () => api.get('/worktypes/');
 export const createWorkLog = (data) => api.post('/worklogs/', data);
-export const getWorkLogs = () => api.get('/worklogs/');
+export const getWorkLogs = (params) => api.get('/worklogs/', { params });
+export const exportWorkLogs = (params, type = 'csv') => api.get('/worklogs/export/', { params: { ...params, type }, responseType: 'blob' });
+export const importWorkLogs = (file) => { const data = new FormData(); data.append('file', file); return api.post('/worklogs/import/', data); };
 
 // --- НОВЫЕ МЕТОДЫ ДЛЯ ВЛОЖЕНИЙ И УВЕДОМЛЕНИЙ ---
 export const getNotifications = () => api.get('/notifications/');
 export const markAllNotificationsRead = () => api.post('/notifications/mark_all_read/');
+export const markNotificationsRead = (ids) => api.post('/notifications/mark_read/', { ids });
+export const getUnreadNotificationsCount = () => api.get('/notifications/unread_count/');
+export const getNotificationsSince = (after, wait = 25) => api.get('/notifications/since/', { params: { after, wait } });
 export const uploadTicketAttachment = (formData) => api.post('/attachments/', formData, {
     headers: { 'Content-Type': 'multipart/form-data' }
 });
 
+// Большие файлы - по частям: каждая часть отдельным коротким запросом, после обрыва загрузка продолжается с принятого offset
+export const uploadTicketAttachmentChunked = async (ticketId, file, onProgress) => {
+    const { data: upload } = await api.post('/attachment-uploads/', { ticket: ticketId, filename: file.name, size: file.size });
+    let offset = upload.offset;
+    let retries = 0;
+    while (true) {
+        const end = Math.min(offset + upload.chunk_size, file.size);
+        try {
+            const { status, data } = await api.put(`/attachment-uploads/${upload.id}/`, file.slice(offset, end), {
+                headers: { 'Content-Type': 'application/octet-stream', 'Content-Range': `bytes ${offset}-${end - 1}/${file.size}` }
+            });
+            if (onProgress) onProgress(end / file.size);
+            if (status === 201) return data;
+            offset = data.offset;
+            retries = 0;
+        } catch (error) {
+            if (++retries > 3) throw error;
+            const { data } = await api.get(`/attachment-uploads/${upload.id}/`);
+            offset = data.offset;
+        }
+    }
+};
+
 // --- НОВЫЕ МЕТОДЫ ДЛЯ МОДЕРИНИЗИРОВАННОГО ДАШБОРДА ---
 export const getCompanyEvents = () => api.get('/events/');
 export const createCompanyEvent = (data) => api.post('/events/', data);
@@ -60,11 +94,13 @@ export const getStage = (id) => api.get(`/stages/${id}/`);
 export const createStage = (data) => api.post('/stages/', data);
 
 export const updateStage = (id, data) => api.patch(`/stages/${id}/`, data);
+export const getStageBurndown = (id, params) => api.get(`/stages/${id}/burndown/`, { params });
 
 
 export const getProjectReleases = (projectId) => api.get(`/releases/?project=${projectId}`);
 export const createProjectRelease = (data) => api.post('/releases/', data);
 export const publishProjectRelease = (id) => api.post(`/releases/${id}/publish/`);
+export const getReleaseProgress = (id, params) => api.get(`/releases/${id}/progress/`, { params });
 
 export const getTags = () => api.get('/tags/');
 
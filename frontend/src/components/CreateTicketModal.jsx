@@ -16,7 +16,7 @@ const CreateTicketModal = ({ onClose, onTicketCreated, preselectedProject = null
 
     useEffect(() => {
         getProjects().then(res => setProjects(Array.isArray(res.data) ? res.data : (res.data.results || [])));
-        getUsers().then(res => setUsers(Array.isArray(res.data) ? res.data : (res.data.results || [])));
+        getUsers({ fields: 'id,username,first_name' }).then(res => setUsers(Array.isArray(res.data) ? res.data : (res.data.results || [])));
     }, []);
 
     useEffect(() => {
@@ -1,6 +1,6 @@
 import { useEffect, useState } from 'react';
 import { useParams, useNavigate, useSearchParams } from 'react-router-dom';
-import { getUsers, getSkills, updateProfile, getTickets, getWorkLogs } from '../api';
+import { getUser, getSkills, updateProfile, getTickets, getWorkLogs } from '../api';
 import { Edit3, Briefcase, Ticket, Clock, CheckCircle2, Target, FolderKanban, Star, X, ChevronLeft, ChevronRight, Send, Gitlab, Github, Megaphone, Share2, Phone, Mail, Code, Bug, Palette, Headphones, Users as UsersIcon } from 'lucide-react';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip as RechartsTooltip, ResponsiveContainer, PieChart, Pie, Cell } from 'recharts';
 
@@ -52,11 +52,10 @@ const Profile = () => {
     const fetchData = async () => {
         try {
             const [usersRes, skillsRes, tRes, lRes] = await Promise.all([
-                getUsers(), getSkills(), getTickets(), getWorkLogs()
+                getUser(targetUserId), getSkills(), getTickets(), getWorkLogs()
             ]);
 
-            const allUsers = Array.isArray(usersRes.data) ? usersRes.data : (usersRes.data.results || []);
-            const targetUser = allUsers.find(u => u.id === targetUserId);
+            const targetUser = usersRes.data;
 
             if (!targetUser) return;
 
@@ -254,7 +253,7 @@ const Profile = () => {
             <div className="biz-card" style={{ display: 'flex', alignItems: 'center', justifyContent: 'space-between', padding: '2rem' }}>
                 <div style={{ display: 'flex', alignItems: 'flex-start', gap: '2rem' }}>
                     {user.profile?.avatar ? (
-                        <img src={user.profile.avatar} alt="avatar" style={{ width: 100, height: 100, borderRadius: '50%', objectFit: 'cover', border: '4px solid #f3f4f6' }} />
+                        <img src={user.profile.avatar_variants?.lg?.webp || user.profile.avatar} alt="avatar" style={{ width: 100, height: 100, borderRadius: '50%', objectFit: 'cover', border: '4px solid #f3f4f6' }} />
                     ) : (
                         <div style={{ width: 100, height: 100, borderRadius: '50%', background: '#4f46e5', color: 'white', display: 'flex', alignItems: 'center', justifyContent: 'center', fontSize: '3rem', fontWeight: 'bold', border: '4px solid #f3f4f6' }}>
                             {user.first_name ? user.first_name[0].toUpperCase() : user.username[0].toUpperCase()}
@@ -1,25 +1,17 @@
 import { useEffect, useState } from 'react';
-import { getProjects, getUsers, getTickets, getWorkLogs } from '../api';
+import { getReports } from '../api';
 import { PieChart, Clock, FolderKanban, Users, Activity, TrendingUp } from 'lucide-react';
 
 const Reports = () => {
-    const [data, setData] = useState({ projects: [], users: [], tickets: [], logs: [] });
+    const [data, setData] = useState({ totals: { minutes: 0, logs_count: 0, done_tickets_count: 0 }, by_project: [], by_user: [] });
     const [loading, setLoading] = useState(true);
 
     useEffect(() => {
-        const fetchAllData = async () => {
+        const fetchReports = async () => {
             try {
-                // Запрашиваем все нужные данные параллельно для скорости
-                const [projRes, usersRes, ticketsRes, logsRes] = await Promise.all([
-                    getProjects(), getUsers(), getTickets(), getWorkLogs()
-                ]);
-
-                setData({
-                    projects: projRes.data,
-                    users: usersRes.data,
-                    tickets: ticketsRes.data,
-                    logs: logsRes.data
-                });
+                // Вся агрегация выполняется на сервере, приходят только итоговые строки
+                const res = await getReports();
+                setData(res.data);
             } catch (error) {
                 console.error("Ошибка при загрузке данных для отчетов", error);
             } finally {
@@ -27,35 +19,15 @@ const Reports = () => {
             }
         };
 
-        fetchAllData();
+        fetchReports();
     }, []);
 
     if (loading) return <div>Формируем отчеты...</div>;
 
-    // --- АГРЕГАЦИЯ ДАННЫХ ---
-
-    // 1. Общее время
-    const totalMinutes = data.logs.reduce((acc, log) => acc + log.time_spent_minutes, 0);
+    const totalMinutes = data.totals.minutes;
     const totalHours = Math.floor(totalMinutes / 60);
-
-    // 2. Время по проектам
-    const timeByProject = data.projects.map(project => {
-        // Находим ID всех задач этого проекта
-        const projectTicketIds = data.tickets.filter(t => t.project === project.id).map(t => t.id);
-        // Считаем время по логам, которые привязаны к этим задачам
-        const minutes = data.logs
-            .filter(log => projectTicketIds.includes(log.ticket))
-            .reduce((acc, log) => acc + log.time_spent_minutes, 0);
-        return { ...project, minutes };
-    }).filter(p => p.minutes > 0).sort((a, b) => b.minutes - a.minutes); // Сортируем по убыванию
-
-    // 3. Время по сотрудникам
-    const timeByUser = data.users.map(user => {
-        const minutes = data.logs
-            .filter(log => log.user === user.id)
-            .reduce((acc, log) => acc + log.time_spent_minutes, 0);
-        return { ...user, minutes };
-    }).filter(u => u.minutes > 0).sort((a, b) => b.minutes - a.minutes);
+    const timeByProject = data.by_project.map(p => ({ id: p.project_id, name: p.project_name, minutes: p.minutes }));
+    const timeByUser = data.by_user.map(u => ({ id: u.user_id, username: u.username, first_name: u.first_name, last_name: u.last_name, minutes: u.minutes }));
 
     // Вспомогательная функция форматирования времени
     const formatTime = (mins) => `${Math.floor(mins / 60)}ч ${mins % 60}м`;
@@ -85,14 +57,14 @@ const Reports = () => {
                 <div className="biz-card" style={{ display: 'flex', alignItems: 'center', gap: '1.5rem' }}>
                     <div style={{ background: '#f0fdf4', padding: '1rem', borderRadius: '14px', color: '#15803d' }}><TrendingUp size={28} /></div>
                     <div>
-                        <div style={{ fontSize: '2rem', fontWeight: '800', color: '#111827', lineHeight: 1, marginBottom: '0.2rem' }}>{data.tickets.filter(t => t.status === 'DONE').length}</div>
+                        <div style={{ fontSize: '2rem', fontWeight: '800', color: '#111827', lineHeight: 1, marginBottom: '0.2rem' }}>{data.totals.done_tickets_count}</div>
                         <div style={{ color: '#6b7280', fontSize: '0.9rem', fontWeight: '500' }}>Задач выполнено</div>
                     </div>
                 </div>
                 <div className="biz-card" style={{ display: 'flex', alignItems: 'center', gap: '1.5rem' }}>
                     <div style={{ background: '#f3f4f6', padding: '1rem', borderRadius: '14px', color: '#4b5563' }}><Activity size={28} /></div>
                     <div>
-                        <div style={{ fontSize: '2rem', fontWeight: '800', color: '#111827', lineHeight: 1, marginBottom: '0.2rem' }}>{data.logs.length}</div>
+                        <div style={{ fontSize: '2rem', fontWeight: '800', color: '#111827', lineHeight: 1, marginBottom: '0.2rem' }}>{data.totals.logs_count}</div>
                         <div style={{ color: '#6b7280', fontSize: '0.9rem', fontWeight: '500' }}>Записей в логах</div>
                     </div>
                 </div>
@@ -139,7 +111,7 @@ const Reports = () => {
                                     </div>
                                     <div style={{ flex: 1 }}>
                                         <div style={{ fontWeight: '600', color: '#111827', marginBottom: '0.2rem' }}>{user.first_name || user.username} {user.last_name}</div>
-                                        <div style={{ fontSize: '0.8rem', color: '#6b7280' }}>{user.profile?.department_details?.name || 'Без отдела'}</div>
+                                        <div style={{ fontSize: '0.8rem', color: '#6b7280' }}>{user.username}</div>
                                     </div>
                                     <div style={{ fontWeight: '700', color: '#4f46e5', fontSize: '1.1rem' }}>
                                         {formatTime(user.minutes)}
@@ -40,7 +40,7 @@ const Team = () => {
 
     const filteredUsers = (Array.isArray(users) ? users : []).filter(u => {
         if (activeTab === 'all') return true;
-        const depts = (u.profile?.departments_details || []).map(link => link.department_details?.name?.toLowerCase() || '');
+        const depts = (u.departments || []).map(link => link.department_details?.name?.toLowerCase() || '');
         if (activeTab === 'dev') return depts.some(d => d.includes('разраб'));
         if (activeTab === 'qa') return depts.some(d => d.includes('тест'));
         if (activeTab === 'design') return depts.some(d => d.includes('дизайн'));
@@ -53,7 +53,7 @@ const Team = () => {
         <div style={{ padding: '0 0.5rem 2rem 0.5rem' }}>
             <div style={{ display: 'grid', gridTemplateColumns: 'repeat(2, 1fr)', gap: '1.5rem' }}>
                 {filteredUsers.map(user => {
-                    const hasAvatar = !!user.profile?.avatar;
+                    const hasAvatar = !!user.avatar;
 
                     return (
                         // ИСПРАВЛЕНИЕ ЗДЕСЬ: Возвращен правильный путь /team/${user.id}
@@ -61,7 +61,7 @@ const Team = () => {
                             <div style={{ display: 'flex', gap: '1.5rem', alignItems: 'flex-start' }}>
                                 <div style={{ display: 'flex', flexDirection: 'column', alignItems: 'center', gap: '0.8rem' }}>
                                     <div style={{ width: 70, height: 70, borderRadius: '50%', background: '#f3f4f6', overflow: 'hidden', border: '2px solid #e5e7eb', display: 'flex', alignItems: 'center', justifyContent: 'center' }}>
-                                        {hasAvatar ? <img src={user.profile.avatar} style={{ width: '100%', height: '100%', objectFit: 'cover' }} /> : <UsersIcon size={30} color="#9ca3af" />}
+                                        {hasAvatar ? <img src={user.avatar_variants?.md?.webp || user.avatar} loading="lazy" style={{ width: '100%', height: '100%', objectFit: 'cover' }} /> : <UsersIcon size={30} color="#9ca3af" />}
                                     </div>
                                     <div style={{ display: 'flex', alignItems: 'center', gap: '0.3rem', background: user.active_tickets_count > 0 ? '#eff6ff' : '#f9fafb', color: user.active_tickets_count > 0 ? '#2563eb' : '#9ca3af', padding: '0.3rem 0.6rem', borderRadius: '99px', fontSize: '0.75rem', fontWeight: '600' }}>
                                         <Target size={12} /> Задач: {user.active_tickets_count || 0}
@@ -72,7 +72,7 @@ const Team = () => {
                                     <div style={{ color: '#6b7280', fontSize: '0.85rem' }}>@{user.username}</div>
 
                                     <div style={{ display: 'flex', flexWrap: 'wrap', gap: '0.5rem', marginTop: '1rem' }}>
-                                        {user.profile?.departments_details?.map(link => {
+                                        {user.departments?.map(link => {
                                             const level = getLevelConfig(link.level);
                                             const dept = link.department_details;
                                             return (
@@ -88,7 +88,7 @@ const Team = () => {
 
                                     <div style={{ display: 'flex', flexDirection: 'column', gap: '0.4rem', marginTop: '1rem', color: '#6b7280', fontSize: '0.85rem' }}>
                                         {user.email && <div style={{ display: 'flex', alignItems: 'center', gap: '0.5rem' }}><Mail size={14} /> {user.email}</div>}
-                                        {user.profile?.tg_link && <div style={{ display: 'flex', alignItems: 'center', gap: '0.5rem', color: '#0ea5e9', fontWeight: '500' }}><Send size={14} /> Telegram</div>}
+                                        {user.tg_link && <div style={{ display: 'flex', alignItems: 'center', gap: '0.5rem', color: '#0ea5e9', fontWeight: '500' }}><Send size={14} /> Telegram</div>}
                                     </div>
                                 </div>
                             </div>
@@ -1,9 +1,12 @@
 import { useEffect, useState } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
-import { getTicket, startTimer, stopTimer, createComment, getWorkTypes, updateTicket, createNote, uploadTicketAttachment, getUsers, getStages, getTags } from '../api';
+import { getTicket, startTimer, stopTimer, createComment, getWorkTypes, updateTicket, createNote, uploadTicketAttachment, uploadTicketAttachmentChunked, getUsers, getStages, getTags } from '../api';
 import { ArrowLeft, Play, Square, MessageSquare, Clock, ChevronRight, Activity, StickyNote, History, Paperclip, Download, Upload, Plus, X } from 'lucide-react';
 import 'react-quill/dist/quill.snow.css';
 
+// Файлы больше этого размера грузятся по частям (/api/attachment-uploads/)
+const CHUNKED_UPLOAD_THRESHOLD = 8 * 1024 * 1024;
+
 const TicketDetail = () => {
     const { id } = useParams();
     const navigate = useNavigate();
@@ -49,7 +52,7 @@ const TicketDetail = () => {
     useEffect(() => {
         fetchTicket();
         getWorkTypes().then(res => setWorkTypes(Array.isArray(res.data) ? res.data : (res.data.results || [])));
-        getUsers().then(res => setUsers(Array.isArray(res.data) ? res.data : (res.data.results || [])));
+        getUsers({ fields: 'id,username,first_name' }).then(res => setUsers(Array.isArray(res.data) ? res.data : (res.data.results || [])));
         getTags().then(res => setTags(Array.isArray(res.data) ? res.data : (res.data.results || [])));
     }, [id]);
 
@@ -113,7 +116,11 @@ const TicketDetail = () => {
         setUploadingFile(true);
         const formData = new FormData();
         formData.append('ticket', ticket.id); formData.append('file', file);
-        try { await uploadTicketAttachment(formData); await fetchTicket(); }
+        try {
+            if (file.size > CHUNKED_UPLOAD_THRESHOLD) await uploadTicketAttachmentChunked(ticket.id, file);
+            else await uploadTicketAttachment(formData);
+            await fetchTicket();
+        }
         catch (error) { alert("Ошибка при загрузке файла"); } finally { setUploadingFile(false); e.target.value = null; }
     };
 
@@ -185,12 +192,14 @@ const TicketDetail = () => {
                                 <div style={{ display: 'flex', flexWrap: 'wrap', gap: '1rem' }}>
                                     {ticket.attachments_details.map(att => (
                                         <div key={att.id} style={{ display: 'flex', alignItems: 'center', gap: '0.8rem', padding: '0.8rem', border: '1px solid #e5e7eb', borderRadius: '8px', background: '#f9fafb', minWidth: '200px' }}>
-                                            <div style={{ background: '#e0e7ff', color: '#4f46e5', padding: '0.5rem', borderRadius: '6px' }}><Paperclip size={16} /></div>
+                                            {att.thumbnail_url
+                                                ? <img src={att.thumbnail_url} alt="" loading="lazy" style={{ width: 40, height: 40, objectFit: 'cover', borderRadius: '6px' }} />
+                                                : <div style={{ background: '#e0e7ff', color: '#4f46e5', padding: '0.5rem', borderRadius: '6px' }}><Paperclip size={16} /></div>}
                                             <div style={{ flex: 1, overflow: 'hidden' }}>
-                                                <div style={{ fontSize: '0.85rem', fontWeight: '600', color: '#111827', whiteSpace: 'nowrap', overflow: 'hidden', textOverflow: 'ellipsis' }}>{att.file_name}</div>
+                                                <div style={{ fontSize: '0.85rem', fontWeight: '600', color: '#111827', whiteSpace: 'nowrap', overflow: 'hidden', textOverflow: 'ellipsis' }}>{att.filename}</div>
                                                 <div style={{ fontSize: '0.7rem', color: '#9ca3af' }}>{new Date(att.created_at).toLocaleDateString()}</div>
                                             </div>
-                                            <a href={att.file} target="_blank" rel="noopener noreferrer" style={{ color: '#6b7280', padding: '0.3rem', borderRadius: '50%', cursor: 'pointer' }}><Download size={16} /></a>
+                                            <a href={att.download_url} target="_blank" rel="noopener noreferrer" style={{ color: '#6b7280', padding: '0.3rem', borderRadius: '50%', cursor: 'pointer' }}><Download size={16} /></a>
                                         </div>
                                     ))}
                                 </div>
@@ -1,6 +1,6 @@
 import { useEffect, useState } from 'react';
 import { useNavigate, useSearchParams } from 'react-router-dom';
-import { getTickets, startTimer, stopTimer, getUsers, getProjects } from '../api';
+import { getTickets, startTimer, stopTimer, getActiveTimer, getUsers, getProjects } from '../api';
 import { ListTodo, Play, Square, Clock, Plus, Filter, SortAsc, SortDesc, X, AlertOctagon } from 'lucide-react';
 import CreateTicketModal from './CreateTicketModal';
 
@@ -15,6 +15,7 @@ const Tickets = () => {
     const [tickets, setTickets] = useState([]);
     const [users, setUsers] = useState([]);
     const [projects, setProjects] = useState([]);
+    const [activeTimer, setActiveTimer] = useState(null);
     const [loading, setLoading] = useState(true);
     const [actionLoading, setActionLoading] = useState(null);
     const [showCreateModal, setShowCreateModal] = useState(false);
@@ -34,10 +35,11 @@ const Tickets = () => {
 
     const fetchData = async () => {
         try {
-            const [tRes, uRes, pRes] = await Promise.all([getTickets(), getUsers(), getProjects()]);
+            const [tRes, uRes, pRes, aRes] = await Promise.all([getTickets(), getUsers({ fields: 'id,username,first_name' }), getProjects(), getActiveTimer()]);
             setTickets(Array.isArray(tRes.data) ? tRes.data : (tRes.data.results || []));
             setUsers(Array.isArray(uRes.data) ? uRes.data : (uRes.data.results || []));
             setProjects(Array.isArray(pRes.data) ? pRes.data : (pRes.data.results || []));
+            setActiveTimer(aRes.data.active_timer);
         } catch (error) { console.error("Ошибка загрузки", error); } finally { setLoading(false); }
     };
 
@@ -46,7 +48,7 @@ const Tickets = () => {
     const handleTimer = async (ticket) => {
         setActionLoading(ticket.id);
         try {
-            if (ticket.active_timer) await stopTimer(ticket.id);
+            if (activeTimer?.ticket === ticket.id) await stopTimer(ticket.id);
             else await startTimer(ticket.id, {});
             await fetchData();
         } catch (error) { alert("Убедитесь, что внутри задачи выбран тип работ."); } finally { setActionLoading(null); }
@@ -128,7 +130,7 @@ const Tickets = () => {
                 ) : (
                     filteredTickets.map(ticket => {
                         const assigneeName = ticket.assignee_details ? (ticket.assignee_details.first_name || ticket.assignee_details.username) : "Не назначен";
-                        const isActive = !!ticket.active_timer;
+                        const isActive = activeTimer?.ticket === ticket.id;
                         const isCritical = ticket.priority === 'CRITICAL';
 
                         const rowBackground = isActive ? '#f0fdf4' : isCritical ? '#fff1f2' : 'transparent';
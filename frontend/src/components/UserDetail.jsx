@@ -1,6 +1,6 @@
 import { useEffect, useState } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
-import { getUsers, getTickets, getWorkLogs } from '../api';
+import { getUser, getTickets, getWorkLogs } from '../api';
 import { ArrowLeft, ArrowRight, Mail, Send, Phone, Clock, Code, Bug, Palette, Briefcase, Headphones, Users as UsersIcon, ListTodo, CheckCircle2, Star } from 'lucide-react';
 
 const getDepartmentIcon = (deptName) => {
@@ -41,9 +41,8 @@ const UserDetail = () => {
     useEffect(() => {
         const fetchData = async () => {
             try {
-                const [uRes, tRes, lRes] = await Promise.all([getUsers(), getTickets(), getWorkLogs()]);
-                const found = (uRes.data.results || uRes.data).find(u => u.id === parseInt(id));
-                setUser(found);
+                const [uRes, tRes, lRes] = await Promise.all([getUser(id), getTickets(), getWorkLogs()]);
+                setUser(uRes.data);
                 setTickets((tRes.data.results || tRes.data).filter(t => t.assignee === parseInt(id)));
                 setWorkLogs((lRes.data.results || lRes.data).filter(l => l.user === parseInt(id)));
             } catch (e) { console.error(e); } finally { setLoading(false); }
@@ -86,7 +85,7 @@ const UserDetail = () => {
                 <div style={{ display: 'flex', flexDirection: 'column', gap: '1.5rem' }}>
                     <div className="biz-card" style={{ textAlign: 'center' }}>
                         <div style={{ width: 120, height: 120, borderRadius: '50%', background: '#f3f4f6', margin: '0 auto 1.5rem auto', overflow: 'hidden', border: '3px solid #e5e7eb', display: 'flex', alignItems: 'center', justifyContent: 'center' }}>
-                            {hasAvatar ? <img src={user.profile.avatar} style={{ width: '100%', height: '100%', objectFit: 'cover' }} /> : <UsersIcon size={50} color="#9ca3af" />}
+                            {hasAvatar ? <img src={user.profile.avatar_variants?.lg?.webp || user.profile.avatar} style={{ width: '100%', height: '100%', objectFit: 'cover' }} /> : <UsersIcon size={50} color="#9ca3af" />}
                         </div>
                         <h2 style={{ margin: '0 0 0.3rem 0' }}>{user.first_name || user.username} {user.last_name || ''}</h2>
                         <div style={{ color: '#6b7280', fontSize: '0.95rem', marginBottom: '1.5rem' }}>@{user.username}</div>